@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+"""
+Воспроизводимые замеры main() всех пяти задач.
+
+Входы генерируются синтетически с фиксированным seed: случайные деревья и
+длинные цепочки для task0–task2, согласованные и противоположные пары
+ранжировок для task3, наборы термов и правил растущего размера для task4.
+Для каждого случая и размера меряется время (min и медиана по повторам) и
+отдельным прогоном — пиковая память через tracemalloc.
+
+    python benchmarks/bench.py --out results.json
+    python benchmarks/bench.py --quick --baseline benchmarks/baseline.json
+    python benchmarks/bench.py --quick --save-baseline benchmarks/baseline.json
+
+С --baseline выводятся случаи, у которых медиана выросла больше чем на
+--threshold (доля), и код возврата становится 1. benchmarks/baseline.json —
+замер --quick на одной машине (см. его "meta"); время зависит от железа,
+поэтому на другой машине базу сначала стоит пересохранить.
+"""
+
+import argparse
+import gc
+import importlib.util
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SIZES = (10, 100, 1000, 10000, 50000)
+QUICK_SIZES = (10, 100, 1000)
+
+
+def _load_task(i: int) -> Any:
+    # все решения лежат в taskN/task.py, поэтому грузятся под разными именами
+    name = f"task{i}"
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, name, "task.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+# --- генераторы входов ---
+
+def random_tree(n: int, rng: random.Random) -> Tuple[str, str]:
+    # родитель каждой вершины — случайная из уже добавленных; корень "1"
+    lines = [f"{rng.randint(1, v - 1)},{v}" for v in range(2, n + 1)]
+    return "\n".join(lines), "1"
+
+
+def chain(n: int, rng: random.Random) -> Tuple[str, str]:
+    lines = [f"{v - 1},{v}" for v in range(2, n + 1)]
+    return "\n".join(lines), "1"
+
+
+def _to_ranking(order: List[int], rng: random.Random, tie: float) -> List[Any]:
+    # соседние объекты с вероятностью tie склеиваются в кластер
+    ranking: List[Any] = []
+    for x in order:
+        if ranking and rng.random() < tie:
+            last = ranking[-1]
+            ranking[-1] = (last if isinstance(last, list) else [last]) + [x]
+        else:
+            ranking.append(x)
+    return ranking
+
+
+def rankings_agreeing(n: int, rng: random.Random) -> Tuple[str, str]:
+    # одинаковый порядок, кластеры у экспертов разные
+    order = list(range(1, n + 1))
+    return (json.dumps(_to_ranking(order, rng, 0.2)),
+            json.dumps(_to_ranking(order, rng, 0.2)))
+
+
+def rankings_adversarial(n: int, rng: random.Random) -> Tuple[str, str]:
+    # второй эксперт почти полностью переворачивает первого: ядро ~n²/2 пар
+    order = list(range(1, n + 1))
+    rng.shuffle(order)
+    reverse = order[::-1]
+    for _ in range(n // 20):
+        i, j = rng.randrange(n), rng.randrange(n)
+        reverse[i], reverse[j] = reverse[j], reverse[i]
+    return (json.dumps(_to_ranking(order, rng, 0.1)),
+            json.dumps(_to_ranking(reverse, rng, 0.1)))
+
+
+def _triangle_terms(k: int, lo: float, hi: float, prefix: str) -> List[Dict[str, Any]]:
+    step = (hi - lo) / (k + 1)
+    return [{"id": f"{prefix}{j}",
+             "points": [[lo + j * step, 0], [lo + (j + 1) * step, 1], [lo + (j + 2) * step, 0]]}
+            for j in range(k)]
+
+
+def fuzzy_config(n: int, rng: random.Random) -> Tuple[str, str, str]:
+    # n термов на входе, n // 4 + 1 на выходе, 2n правил
+    k_out = n // 4 + 1
+    temp = {"температура": _triangle_terms(n, 0.0, 100.0, "t")}
+    control = {"управление": _triangle_terms(k_out, 0.0, 10.0, "u")}
+    rules = [[f"t{rng.randrange(n)}", f"u{rng.randrange(k_out)}"] for _ in range(2 * n)]
+    return (json.dumps(temp, ensure_ascii=False), json.dumps(control, ensure_ascii=False),
+            json.dumps(rules))
+
+
+def fuzzy_multi_config(n: int, rng: random.Random) -> Tuple[str, str, str]:
+    # три входа по 16 термов, n правил с И/ИЛИ от одной до трёх посылок
+    names = ["температура", "скорость", "ошибка"]
+    inputs = {name: _triangle_terms(16, -50.0, 50.0, "t") for name in names}
+    control = {"управление": _triangle_terms(8, 0.0, 10.0, "u")}
+    rules = []
+    for _ in range(n):
+        antecedents = rng.sample(names, rng.randint(1, 3))
+        rules.append({"if": {name: f"t{rng.randrange(16)}" for name in antecedents},
+                      "op": rng.choice(["and", "or"]),
+                      "then": f"u{rng.randrange(8)}"})
+    return (json.dumps(inputs, ensure_ascii=False), json.dumps(control, ensure_ascii=False),
+            json.dumps(rules, ensure_ascii=False))
+
+
+# --- случаи ---
+
+def _clear_caches(*modules: Any) -> None:
+    # main() кэширует разбор входов; замер должен включать его
+    for module in modules:
+        for name in ("compile_graph", "compile_controller", "compile_multi_controller"):
+            fn = getattr(module, name, None)
+            if fn is not None:
+                fn.cache_clear()
+
+
+def _graph_case(task: int, generator: Callable, **kwargs: Any) -> Callable:
+    def setup(n: int, rng: random.Random) -> Callable[[], Any]:
+        module = _load_task(task)
+        csv, root = generator(n, rng)
+
+        def run() -> Any:
+            _clear_caches(module)
+            if task == 0:
+                return module.main(csv, **kwargs)
+            return module.main(csv, root, **kwargs)
+        return run
+    return setup
+
+
+def _ranking_case(generator: Callable) -> Callable:
+    def setup(n: int, rng: random.Random) -> Callable[[], Any]:
+        module = _load_task(3)
+        a, b = generator(n, rng)
+        return lambda: module.main(a, b)
+    return setup
+
+
+def _fuzzy_main(n: int, rng: random.Random) -> Callable[[], Any]:
+    # холодный вызов: компиляция конфигурации и один вывод
+    module = _load_task(4)
+    temp, control, rules = fuzzy_config(n, rng)
+    t = rng.uniform(0.0, 100.0)
+
+    def run() -> Any:
+        _clear_caches(module)
+        return module.main(temp, control, rules, t)
+    return run
+
+
+def _fuzzy_infer(n: int, rng: random.Random) -> Callable[[], Any]:
+    # тёплый контроллер, 1000 выводов
+    module = _load_task(4)
+    controller = module.FuzzyController(*fuzzy_config(n, rng))
+    ts = [rng.uniform(0.0, 100.0) for _ in range(1000)]
+    return lambda: [controller.infer(t) for t in ts]
+
+
+def _fuzzy_multi(n: int, rng: random.Random) -> Callable[[], Any]:
+    # n правил по трём входам, 100 выводов
+    module = _load_task(4)
+    controller = module.MultiInputController(*fuzzy_multi_config(n, rng))
+    names = ["температура", "скорость", "ошибка"]
+    points = [{name: rng.uniform(-50.0, 50.0) for name in names} for _ in range(100)]
+    return lambda: [controller.infer(x) for x in points]
+
+
+# имя -> (setup, наибольший размер); матричные способы ограничены меньшими n
+CASES: Dict[str, Tuple[Callable[[int, random.Random], Callable[[], Any]], int]] = {
+    "task0.tree.list": (_graph_case(0, random_tree), 2000),
+    "task0.tree.csr": (_graph_case(0, random_tree, fmt='csr'), 50000),
+    "task0.chain.csr": (_graph_case(0, chain, fmt='csr'), 50000),
+    "task1.tree.dense": (_graph_case(1, random_tree), 1000),
+    "task1.chain.dense": (_graph_case(1, chain), 1000),
+    "task1.tree.sparse": (_graph_case(1, random_tree, output='sparse'), 50000),
+    "task1.chain.sparse": (_graph_case(1, chain, output='sparse'), 50000),
+    "task2.tree.counts": (_graph_case(2, random_tree), 50000),
+    "task2.chain.counts": (_graph_case(2, chain), 50000),
+    "task2.tree.matrix": (_graph_case(2, random_tree, method='matrix'), 300),
+    "task3.agreeing": (_ranking_case(rankings_agreeing), 50000),
+    "task3.adversarial": (_ranking_case(rankings_adversarial), 2000),
+    "task4.main": (_fuzzy_main, 1000),
+    "task4.infer": (_fuzzy_infer, 1000),
+    "task4.multi": (_fuzzy_multi, 10000),
+}
+
+
+# --- замер ---
+
+def measure(run: Callable[[], Any], repeat: int, min_time: float = 0.2) -> Dict[str, float]:
+    run()  # прогрев: импорт, ленивые структуры
+    times: List[float] = []
+    deadline = time.perf_counter() + min_time
+    while len(times) < repeat or (time.perf_counter() < deadline and len(times) < 10 * repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - t0)
+        if times[-1] > min_time and len(times) >= 3:
+            break
+
+    # пиковая память — отдельным прогоном, tracemalloc искажает время
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "repeats": len(times),
+        "min_s": min(times),
+        "median_s": statistics.median(times),
+        "peak_kib": peak / 1024,
+    }
+
+
+def run_suite(sizes: Sequence[int] = SIZES, only: Optional[Sequence[str]] = None,
+              repeat: int = 5, seed: int = 0, log: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    results = []
+    for name, (setup, max_size) in CASES.items():
+        if only and not any(name.startswith(prefix) for prefix in only):
+            continue
+        for n in sizes:
+            if n > max_size:
+                continue
+            # у каждого случая свой генератор: входы не зависят от набора случаев
+            run = setup(n, random.Random(f"{seed}:{name}:{n}"))
+            record = {"case": name, "size": n, **measure(run, repeat)}
+            results.append(record)
+            if log is not None:
+                log(f"{name:22} n={n:<6} median {record['median_s'] * 1e3:10.3f} ms"
+                    f"  peak {record['peak_kib']:10.1f} KiB")
+
+    try:
+        import numpy
+        numpy_version: Optional[str] = numpy.__version__
+    except ImportError:
+        numpy_version = None
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+            "numpy": numpy_version,
+            "seed": seed,
+            "repeat": repeat,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any],
+            threshold: float = 0.25) -> List[Dict[str, Any]]:
+    # регрессия — медиана выросла больше чем в (1 + threshold) раз
+    base = {(r["case"], r["size"]): r for r in baseline["results"]}
+    regressions = []
+    for record in current["results"]:
+        old = base.get((record["case"], record["size"]))
+        if old is None or old["median_s"] <= 0:
+            continue
+        ratio = record["median_s"] / old["median_s"]
+        if ratio > 1 + threshold:
+            regressions.append({"case": record["case"], "size": record["size"],
+                                "baseline_s": old["median_s"], "median_s": record["median_s"],
+                                "ratio": ratio})
+    return regressions
+
+
+def _cli(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Замеры времени и памяти main() задач task0–task4")
+    parser.add_argument('--quick', action='store_true', help=f"только размеры {QUICK_SIZES}")
+    parser.add_argument('--sizes', type=int, nargs='+', default=None)
+    parser.add_argument('--only', nargs='+', default=None, help="префиксы имён случаев, например task1")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default=None, help="куда записать результаты (json)")
+    parser.add_argument('--baseline', default=None, help="сравнить с сохранёнными результатами")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="допустимый рост медианы, доля (0.25 — на 25%%)")
+    parser.add_argument('--save-baseline', default=None, help="сохранить результаты как базовые")
+    parser.add_argument('--list', action='store_true', help="показать случаи и выйти")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name, (_, max_size) in CASES.items():
+            print(f"{name:22} до n={max_size}")
+        return 0
+
+    sizes = args.sizes or (QUICK_SIZES if args.quick else SIZES)
+    report = run_suite(sizes, args.only, args.repeat, args.seed,
+                       log=lambda line: print(line, file=sys.stderr))
+
+    for path in (args.out, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=1)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        for r in regressions:
+            print(f"РЕГРЕССИЯ {r['case']} n={r['size']}: {r['baseline_s'] * 1e3:.3f} ms -> "
+                  f"{r['median_s'] * 1e3:.3f} ms (x{r['ratio']:.2f})", file=sys.stderr)
+        if regressions:
+            return 1
+    elif not args.out and not args.save_baseline:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=1)
+        print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(_cli())
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+"""
+Общий код задач task1–task4.
+
+task.py каждой задачи добавляет корень репозитория в sys.path и импортирует
+отсюда нужные модули, поэтому файлы задач по-прежнему запускаются и
+загружаются по пути (importlib, bench.py) без установки пакета.
+"""
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import pickle
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+class ResultCache:
+    """
+    Кэш результатов main() по содержимому входов.
+
+    Ключ — sha256 от нормализованных аргументов. Значение хранится
+    сериализованным (pickle), поэтому каждое попадание возвращает новый
+    объект тех же типов, что и main, и правка результата вызывающим кодом
+    кэш не портит. В памяти — LRU не больше max_entries записей и max_bytes
+    байт; с path результаты пишутся ещё и в sqlite-файл и переживают
+    перезапуск. Файл ограничен так же: max_disk_entries записей и
+    max_disk_bytes байт значений, после каждой записи лишнее удаляется,
+    начиная с самых старых по времени записи. max_age (секунды) ограничивает
+    срок жизни записей в обоих хранилищах. Файл читается через pickle,
+    поэтому он должен быть своим.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: Optional[int] = None,
+                 path: Optional[str] = None, max_age: Optional[float] = None,
+                 max_disk_entries: Optional[int] = 4096, max_disk_bytes: Optional[int] = None) -> None:
+        if max_entries < 1:
+            raise ValueError("max_entries должен быть положительным")
+        if max_disk_entries is not None and max_disk_entries < 1:
+            raise ValueError("max_disk_entries должен быть положительным")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.max_disk_entries = max_disk_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: 'OrderedDict[str, Tuple[bytes, float]]' = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            self._db = sqlite3.connect(path)
+            self._db.execute("CREATE TABLE IF NOT EXISTS results "
+                             "(key TEXT PRIMARY KEY, value BLOB NOT NULL, created REAL NOT NULL)")
+            # по created выбираются записи на удаление
+            self._db.execute("CREATE INDEX IF NOT EXISTS results_created ON results (created)")
+            self._db.commit()
+
+    @staticmethod
+    def key(*parts: Any) -> str:
+        # длина перед каждой частью: ('ab', 'c') и ('a', 'bc') дают разные ключи
+        h = hashlib.sha256()
+        for part in parts:
+            data = str(part).encode('utf-8')
+            h.update(len(data).to_bytes(8, 'little'))
+            h.update(data)
+        return h.hexdigest()
+
+    def _expired(self, created: float) -> bool:
+        return self.max_age is not None and time.time() - created > self.max_age
+
+    def _drop(self, key: str) -> None:
+        data, _ = self._memory.pop(key)
+        self._bytes -= len(data)
+
+    def _remember(self, key: str, data: bytes, created: float) -> None:
+        if key in self._memory:
+            self._drop(key)
+        if self.max_bytes is not None and len(data) > self.max_bytes:
+            return
+        self._memory[key] = (data, created)
+        self._bytes += len(data)
+        while len(self._memory) > self.max_entries or (
+                self.max_bytes is not None and self._bytes > self.max_bytes):
+            _, (old, _) = self._memory.popitem(last=False)
+            self._bytes -= len(old)
+            self.evictions += 1
+
+    def _trim_disk(self, db: sqlite3.Connection) -> None:
+        # самые новые записи остаются, всё сверх лимитов удаляется
+        # (при равном created порядок задаёт ключ)
+        if self.max_disk_entries is not None:
+            cursor = db.execute(
+                "DELETE FROM results WHERE key IN (SELECT key FROM results "
+                "ORDER BY created DESC, key DESC LIMIT -1 OFFSET ?)", (self.max_disk_entries,))
+            self.disk_evictions += cursor.rowcount
+        if self.max_disk_bytes is not None:
+            cursor = db.execute(
+                "DELETE FROM results WHERE key IN (SELECT key FROM (SELECT key, "
+                "SUM(length(value)) OVER (ORDER BY created DESC, key DESC) AS total FROM results) "
+                "WHERE total > ?)", (self.max_disk_bytes,))
+            self.disk_evictions += cursor.rowcount
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        entry = self._memory.get(key)
+        if entry is not None:
+            if not self._expired(entry[1]):
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return True, pickle.loads(entry[0])
+            self._drop(key)
+
+        if self._db is not None:
+            row = self._db.execute("SELECT value, created FROM results WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                if not self._expired(row[1]):
+                    self.disk_hits += 1
+                    self._remember(key, row[0], row[1])
+                    return True, pickle.loads(row[0])
+                self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._db.commit()
+
+        self.misses += 1
+        return False, None
+
+    def put(self, key: str, value: Any) -> None:
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        created = time.time()
+        self._remember(key, data, created)
+        if self._db is not None:
+            if self.max_disk_bytes is not None and len(data) > self.max_disk_bytes:
+                # в файл такое значение не помещается, старая копия тоже не нужна
+                self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+            else:
+                self._db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?)", (key, data, created))
+                self._trim_disk(self._db)
+            self._db.commit()
+
+    def prune(self) -> int:
+        # удаляет просроченные записи из памяти и из файла, возвращает их число
+        if self.max_age is None:
+            return 0
+        stale = [key for key, (_, created) in self._memory.items() if self._expired(created)]
+        for key in stale:
+            self._drop(key)
+        removed = len(stale)
+        if self._db is not None:
+            cursor = self._db.execute("DELETE FROM results WHERE created < ?", (time.time() - self.max_age,))
+            self._db.commit()
+            removed += cursor.rowcount
+        return removed
+
+    def clear(self) -> None:
+        self._memory.clear()
+        self._bytes = 0
+        if self._db is not None:
+            self._db.execute("DELETE FROM results")
+            self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            'entries': len(self._memory),
+            'bytes': self._bytes,
+            'evictions': self.evictions,
+            'disk_evictions': self.disk_evictions,
+        }
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
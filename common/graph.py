@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+import mmap
+import os
+from functools import lru_cache
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from common.graph_format import read_graph, write_graph
+
+
+class CompiledGraph:
+    """
+    Граф, один раз разобранный из csv.
+
+    nodes  — отсортированные имена вершин,
+    index  — словарь имя -> номер вершины (поиск за O(1) вместо list.index),
+    edges  — рёбра (i, j) в порядке появления в csv, без повторов,
+    parent — номер непосредственного начальника вершины или -1
+             (при нескольких входящих рёбрах берётся последнее ребро).
+
+    Класс общий для task0–task2, поэтому один и тот же объект можно
+    передавать в main() каждой из них сколько угодно раз без повторного
+    разбора строки.
+
+    closure — готовое замыкание r1 из двоичного файла (load_binary) или None.
+    """
+
+    __slots__ = ('nodes', 'index', 'edges', 'parent', 'closure')
+
+    def __init__(self, nodes: Iterable[str], edges: Iterable[Tuple[int, int]],
+                 parent: Iterable[int]) -> None:
+        self.nodes: Tuple[str, ...] = tuple(nodes)
+        self.index: Dict[str, int] = {name: i for i, name in enumerate(self.nodes)}
+        self.edges: Sequence[Tuple[int, int]] = tuple(edges)
+        self.parent: Sequence[int] = tuple(parent)
+        self.closure: Optional[Sequence[int]] = None
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    @classmethod
+    def from_pairs(cls, pairs: Iterable[Tuple[str, str]]) -> 'CompiledGraph':
+        # pairs читается один раз: имена сразу заменяются временными номерами,
+        # поэтому список строк-пар в памяти не накапливается
+        ids: Dict[str, int] = {}
+        raw: List[Tuple[int, int]] = []
+        for u, v in pairs:
+            i = ids.get(u)
+            if i is None:
+                i = ids[u] = len(ids)
+            j = ids.get(v)
+            if j is None:
+                j = ids[v] = len(ids)
+            raw.append((i, j))
+
+        nodes = sorted(ids)
+        remap = [0] * len(nodes)
+        for new_id, name in enumerate(nodes):
+            remap[ids[name]] = new_id
+        del ids
+
+        parent = [-1] * len(nodes)
+        edges: Dict[Tuple[int, int], None] = {}
+        for i, j in raw:
+            i = remap[i]
+            j = remap[j]
+            edges[(i, j)] = None
+            parent[j] = i
+        return cls(nodes, edges, parent)
+
+    @classmethod
+    def from_csv(cls, csv_string: str) -> 'CompiledGraph':
+        # Один проход по строкам csv
+        pairs = []
+        for edge in csv_string.strip().split('\n'):
+            parts = edge.split(',')
+            pairs.append((parts[0], parts[1]))
+        return cls.from_pairs(pairs)
+
+
+@lru_cache(maxsize=32)
+def compile_graph(csv_string: str) -> CompiledGraph:
+    # Кэш общий для всех задач: одна и та же строка разбирается только один раз
+    return CompiledGraph.from_csv(csv_string)
+
+
+def as_graph(source: Union[str, CompiledGraph]) -> CompiledGraph:
+    # main() принимает либо строку csv, либо уже скомпилированный граф
+    if isinstance(source, str):
+        return compile_graph(source)
+    return source
+
+
+# Источник рёбер: путь, открытый файл или mmap
+EdgeSource = Union[str, os.PathLike, IO[str], IO[bytes], mmap.mmap]
+
+
+def _iter_lines(source: EdgeSource) -> Iterator[str]:
+    if isinstance(source, mmap.mmap):
+        source.seek(0)
+        for line in iter(source.readline, b''):
+            yield line.decode('utf-8')
+        return
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, encoding='utf-8') as f:
+            yield from f
+        return
+    for line in source:
+        yield line.decode('utf-8') if isinstance(line, bytes) else line
+
+
+def iter_edges(source: EdgeSource, header: bool = False) -> Iterator[Tuple[str, str]]:
+    """
+    Потоково читает рёбра (u, v) из csv-файла.
+
+    source — путь к файлу, открытый файл (текстовый или бинарный) или mmap;
+    header — пропустить первую непустую строку (заголовок).
+    Пробелы вокруг имён и пустые строки (в том числе в конце) игнорируются.
+    Весь файл целиком в память не читается.
+    """
+    skip = header
+    for line in _iter_lines(source):
+        line = line.strip()
+        if not line:
+            continue
+        if skip:
+            skip = False
+            continue
+        parts = line.split(',')
+        if len(parts) < 2:
+            raise ValueError(f"Некорректная строка csv: {line!r}")
+        yield (parts[0].strip(), parts[1].strip())
+
+
+def load_graph(source: EdgeSource, header: bool = False) -> CompiledGraph:
+    # Граф строится прямо из потока рёбер; результат можно передавать в main()
+    return CompiledGraph.from_pairs(iter_edges(source, header))
+
+
+# Двоичный формат графа (CGRF) описан в common/graph_format.py, там же его
+# запись и чтение через mmap: edges, parent и closure остаются видами на байты
+# файла.
+def save_binary(graph: CompiledGraph, path: Union[str, os.PathLike],
+                closure: Optional[Iterable[int]] = None) -> None:
+    # closure — строки замыкания r1 для записи в файл (task1 считает их сам)
+    write_graph(path, graph.nodes, graph.edges, graph.parent, closure)
+
+
+def load_binary(path: Union[str, os.PathLike]) -> CompiledGraph:
+    # граф из save_binary; результат можно передавать в main() любой задачи
+    graph = CompiledGraph.__new__(CompiledGraph)
+    graph.nodes, graph.edges, graph.parent, graph.closure = read_graph(path)
+    graph.index = dict(zip(graph.nodes, range(len(graph.nodes))))
+    return graph
+
+
+def convert_csv(source: EdgeSource, path: Union[str, os.PathLike], header: bool = False) -> CompiledGraph:
+    # csv (строка, путь, файл или mmap) -> двоичный файл графа
+    graph = load_graph(source, header)
+    save_binary(graph, path)
+    return graph
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Iterable, Iterator, Optional, Sequence, Tuple, Union
+
+# Двоичный формат графа, все числа little-endian:
+#   заголовок — '<4sIIIIQ4x': b'CGRF', версия, n, m, флаги, длина имён в байтах;
+#   имена     — utf-8 через '\n' (в csv перевода строки внутри имени нет),
+#               дополнены нулями до кратного 8;
+#   edges     — m пар int32 (i, j) в порядке csv, затем parent — n int32,
+#               вместе дополнены до кратного 8;
+#   closure   — при флаге GRAPH_HAS_CLOSURE n строк по ceil(n/8) байт,
+#               бит j строки i — разряд j % 8 байта j // 8.
+# Файл читается через mmap: edges, parent и closure остаются видами на его
+# байты, копируются только имена (для index). Пишет и читает формат только
+# этот модуль, save_binary/load_binary задач лишь собирают CompiledGraph.
+GRAPH_MAGIC = b'CGRF'
+GRAPH_VERSION = 1
+GRAPH_HAS_CLOSURE = 1
+_GRAPH_HEADER = struct.Struct('<4sIIIIQ4x')
+
+
+class EdgeView:
+    """Рёбра (i, j) поверх плоского массива int32 без копирования."""
+
+    __slots__ = ('flat',)
+
+    def __init__(self, flat: Sequence[int]) -> None:
+        self.flat = flat
+
+    def __len__(self) -> int:
+        return len(self.flat) // 2
+
+    def __getitem__(self, k: int) -> Tuple[int, int]:
+        k = range(len(self))[k]
+        return self.flat[2 * k], self.flat[2 * k + 1]
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        it = iter(self.flat)
+        return zip(it, it)
+
+
+class BitRows:
+    """Строки замыкания из файла: int собирается только при обращении."""
+
+    __slots__ = ('buf', 'width')
+
+    def __init__(self, buf: memoryview, width: int) -> None:
+        self.buf = buf
+        self.width = width
+
+    def __len__(self) -> int:
+        return len(self.buf) // self.width if self.width else 0
+
+    def __getitem__(self, i: int) -> int:
+        i = range(len(self))[i]
+        return int.from_bytes(self.buf[i * self.width:(i + 1) * self.width], 'little')
+
+    def __iter__(self) -> Iterator[int]:
+        for i in range(len(self)):
+            yield self[i]
+
+
+def _pad8(size: int) -> bytes:
+    return bytes(-size % 8)
+
+
+def write_graph(path: Union[str, os.PathLike], nodes: Sequence[str], edges: Iterable[Tuple[int, int]],
+                parent: Iterable[int], closure: Optional[Iterable[int]] = None) -> None:
+    # closure — строки замыкания r1 (int-битсеты); None — файл без замыкания
+    n = len(nodes)
+    if any('\n' in name for name in nodes):
+        raise ValueError("Имя вершины не может содержать перевод строки")
+    names = '\n'.join(nodes).encode('utf-8')
+    ints = array('i', [x for edge in edges for x in edge])
+    m = len(ints) // 2
+    ints.extend(parent)
+    if sys.byteorder != 'little':
+        ints.byteswap()
+
+    with open(path, 'wb') as f:
+        flags = GRAPH_HAS_CLOSURE if closure is not None else 0
+        f.write(_GRAPH_HEADER.pack(GRAPH_MAGIC, GRAPH_VERSION, n, m, flags, len(names)))
+        f.write(names)
+        f.write(_pad8(len(names)))
+        ints.tofile(f)
+        f.write(_pad8(4 * len(ints)))
+        if closure is not None:
+            width = (n + 7) // 8
+            for row in closure:
+                f.write(row.to_bytes(width, 'little'))
+
+
+def read_graph(path: Union[str, os.PathLike]) -> Tuple[Tuple[str, ...], EdgeView, Sequence[int], Optional[BitRows]]:
+    # (nodes, edges, parent, closure) из файла write_graph; closure — None без флага
+    with open(path, 'rb') as f:
+        view = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    if len(view) < _GRAPH_HEADER.size:
+        raise ValueError("Файл слишком короткий для графа")
+    magic, version, n, m, flags, names_len = _GRAPH_HEADER.unpack_from(view)
+    if magic != GRAPH_MAGIC:
+        raise ValueError(f"Неизвестная сигнатура файла графа: {magic!r}, ожидалась {GRAPH_MAGIC!r}")
+    if version != GRAPH_VERSION:
+        raise ValueError(f"Неподдерживаемая версия файла графа: {version}, ожидалась {GRAPH_VERSION}")
+
+    pos = _GRAPH_HEADER.size
+    names = str(view[pos:pos + names_len], 'utf-8')
+    pos += names_len + len(_pad8(names_len))
+    ints_len = 4 * (2 * m + n)
+    closure_pos = pos + ints_len + len(_pad8(ints_len))
+    width = (n + 7) // 8
+    end = closure_pos + (n * width if flags & GRAPH_HAS_CLOSURE else 0)
+    if len(view) < end:
+        raise ValueError("Файл графа обрезан")
+
+    ints: Sequence[int]
+    if sys.byteorder == 'little':
+        ints = view[pos:pos + ints_len].cast('i')
+    else:
+        ints = array('i', view[pos:pos + ints_len])
+        ints.byteswap()
+
+    nodes = tuple(names.split('\n')) if n else ()
+    closure = None
+    if flags & GRAPH_HAS_CLOSURE:
+        closure = BitRows(view[closure_pos:end], width)
+    return nodes, EdgeView(ints[:2 * m]), ints[2 * m:], closure
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class Profile:
+    """
+    Замеры по этапам main(..., profile=Profile()).
+
+    main отмечает конец каждого этапа вызовом lap(name, **sizes); длительность
+    этапа — стенное и процессорное время от предыдущей отметки (или от
+    start()), sizes — размеры данных этапа (n, E, |core|, точки сетки и т.п.).
+    Если задан callback(name, wall, cpu, sizes), он вызывается на каждом
+    этапе, иначе записи копятся в records. Без profile main не делает ничего
+    лишнего, кроме проверки на None.
+    """
+
+    __slots__ = ('records', 'callback', '_wall', '_cpu')
+
+    def __init__(self, callback: Optional[Callable[[str, float, float, Dict[str, Any]], None]] = None) -> None:
+        self.records: List[Tuple[str, float, float, Dict[str, Any]]] = []
+        self.callback = callback
+        # отсчёт первого этапа — от создания, если start() не вызван
+        self.start()
+
+    def start(self) -> None:
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+
+    def lap(self, name: str, **sizes: Any) -> None:
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        if self.callback is not None:
+            self.callback(name, wall, cpu, sizes)
+        else:
+            self.records.append((name, wall, cpu, sizes))
+        # время на запись не попадает в следующий этап
+        self.start()
+
+    def flat(self) -> List[Dict[str, Any]]:
+        # плоский профиль: этапы с одинаковым именем складываются,
+        # порядок — по первому появлению, sizes — последние
+        total = sum(wall for _, wall, _, _ in self.records) or 1.0
+        rows: Dict[str, Dict[str, Any]] = {}
+        for name, wall, cpu, sizes in self.records:
+            row = rows.setdefault(name, {'stage': name, 'calls': 0, 'wall': 0.0, 'cpu': 0.0})
+            row['calls'] += 1
+            row['wall'] += wall
+            row['cpu'] += cpu
+            row.update(sizes)
+        for row in rows.values():
+            row['share'] = row['wall'] / total
+        return list(rows.values())
+
+    def format_flat(self) -> str:
+        lines = [f"{'%':>6} {'wall, ms':>10} {'cpu, ms':>10} {'calls':>6}  stage"]
+        for row in sorted(self.flat(), key=lambda r: r['wall'], reverse=True):
+            sizes = ' '.join(f"{k}={v}" for k, v in row.items()
+                             if k not in ('stage', 'calls', 'wall', 'cpu', 'share'))
+            lines.append(f"{row['share'] * 100:6.1f} {row['wall'] * 1e3:10.3f} {row['cpu'] * 1e3:10.3f} "
+                         f"{row['calls']:6d}  {row['stage']} {sizes}".rstrip())
+        return '\n'.join(lines)
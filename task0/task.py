@@ -6,34 +6,112 @@
 #в файле task0\task.py (cpp), которая получает на вход строку 
 #(из csv) и возвращает таблицу (список списков), содержащую матрицу смежности для графа заданного в csv.
 
-def main(csv_string):
-	#разбиваю строку на список рёбер
-	edges = csv_string.strip().split('\n')
-
-	#множество для уникальных вершин
-	nodes_set = set()
-	for edge in edges:
-		parts = edge.split(',')
-		nodes_set.add(parts[0])
-		nodes_set.add(parts[1])
-
-	#сортирую множество (отсортированный список)
-	nodes_list = sorted(list(nodes_set))
-	n = len(nodes_list)
+import os
+import sys
+
+try:
+	import numpy as np
+except ImportError:  #numpy нужен только для форматов 'numpy', 'csr' и 'bits'
+	np = None
+
+try:
+	import scipy.sparse as sp
+except ImportError:
+	sp = None
+
+#общий код задач лежит в common/ в корне репозитория
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _ROOT not in sys.path:
+	sys.path.insert(0, _ROOT)
+
+from common.graph import (CompiledGraph, as_graph as _as_graph, compile_graph, convert_csv, iter_edges,
+	load_binary, load_graph, save_binary)
+from common.graph_format import EdgeView
+
+
+OUTPUT_FORMATS = ('list', 'numpy', 'csr', 'bits')
+
+
+def _edge_arrays(graph):
+	#рёбра в обе стороны (матрица симметричная) в виде двух массивов индексов
+	if not graph.edges:
+		empty = np.zeros(0, dtype=np.int64)
+		return empty, empty
+	if isinstance(graph.edges, EdgeView):
+		#граф из двоичного файла: int32 читаются из буфера без разбора пар
+		pairs = np.asarray(graph.edges.flat, dtype=np.int64).reshape(-1, 2)
+	else:
+		pairs = np.array(graph.edges, dtype=np.int64)
+	rows = np.concatenate((pairs[:, 0], pairs[:, 1]))
+	cols = np.concatenate((pairs[:, 1], pairs[:, 0]))
+	return rows, cols
+
+
+def adjacency(source, fmt='numpy', dtype='uint8'):
+	"""
+	Матрица смежности в числовом формате и порядок вершин.
+
+	fmt:
+		'numpy' — плотный numpy.ndarray n×n (dtype uint8 или bool),
+		'csr'   — scipy.sparse.csr_matrix (хранит только рёбра),
+		'bits'  — упакованная битовая матрица n×ceil(n/8) uint8,
+		          бит j строки i хранится в байте j // 8 под номером j % 8
+		          (младшие биты первыми, как numpy.packbits(..., bitorder='little')).
+
+	Возвращает (матрица, nodes), где nodes[i] — имя вершины i-й строки.
+	"""
+	if fmt not in OUTPUT_FORMATS or fmt == 'list':
+		raise ValueError(f"Неизвестный формат: {fmt!r}, ожидался один из {OUTPUT_FORMATS[1:]}")
+	if np is None:
+		raise ImportError("Для числовых форматов матрицы нужен numpy")
+
+	graph = _as_graph(source)
+	n = len(graph.nodes)
+	rows, cols = _edge_arrays(graph)
+
+	if fmt == 'numpy':
+		matrix = np.zeros((n, n), dtype=dtype)
+		matrix[rows, cols] = 1
+	elif fmt == 'csr':
+		if sp is None:
+			raise ImportError("Для формата 'csr' нужен scipy")
+		data = np.ones(len(rows), dtype=dtype)
+		matrix = sp.csr_matrix((data, (rows, cols)), shape=(n, n))
+		#повторы (петли, встречные рёбра) при сборке складываются — сбрасываем в 1
+		matrix.data[:] = 1
+	else:
+		matrix = np.zeros((n, (n + 7) // 8), dtype=np.uint8)
+		np.bitwise_or.at(matrix, (rows, cols >> 3), (1 << (cols & 7)).astype(np.uint8))
+	return matrix, list(graph.nodes)
+
+
+def main(csv_string, fmt='list', profile=None):
+	#fmt='list' — таблица (список списков), иначе (матрица, порядок вершин)
+	#profile — common.profile.Profile для замеров по этапам (None — без замеров)
+	if profile is not None:
+		profile.start()
+
+	graph = _as_graph(csv_string)
+	n = len(graph.nodes)
+	if profile is not None:
+		profile.lap('parse', n=n, E=len(graph.edges))
+
+	if fmt != 'list':
+		result = adjacency(graph, fmt)
+		if profile is not None:
+			profile.lap('adjacency')
+		return result
 	
 	#матрица n на n, заполненная нулями
 	matrix = [[0] *  n for _ in range(n)]
+	if profile is not None:
+		profile.lap('alloc', cells=n * n)
 	
 	#заполнение матрицы
-	for edge in edges:
-		parts = edge.split(',')
-		u = parts[0]
-		v = parts[1]
-
-		i = nodes_list.index(u)
-		j = nodes_list.index(v)
-
+	for i, j in graph.edges:
 		matrix[i][j] = 1
 		matrix[j][i] = 1 
+	if profile is not None:
+		profile.lap('fill')
 
-	return matrix
\ No newline at end of file
+	return matrix
@@ -1,110 +1,551 @@
 
 # -*- coding: utf-8 -*-
 
-from typing import List, Tuple
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
+try:
+    import numpy as np
+except ImportError:  # numpy нужен только для _closure_parallel
+    np = None
 
-def main(E: str, e: str) -> Tuple[
+# общий код задач лежит в common/ в корне репозитория
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _ROOT not in sys.path:
+    sys.path.insert(0, _ROOT)
+
+from common.cache import ResultCache
+from common.graph import (CompiledGraph, EdgeSource, as_graph as _as_graph, compile_graph, iter_edges, load_binary,
+                          load_graph, save_binary as _save_binary)
+from common.profile import Profile
+
+
+# save_binary и convert_csv из common/graph.py, дополненные замыканием:
+# closure=True дописывает в файл строки r1, чтобы main() не считал их заново
+def save_binary(graph: CompiledGraph, path: Union[str, os.PathLike], closure: bool = False,
+                engine: str = 'dfs') -> None:
+    # closure=True — дописать замыкание r1 (берётся из графа или считается engine)
+    reach = None
+    if closure:
+        reach = graph.closure
+        if reach is None:
+            reach = _transitive_closure(_adjacency_rows(len(graph.nodes), graph.edges), engine)
+    _save_binary(graph, path, reach)
+
+
+def convert_csv(source: EdgeSource, path: Union[str, os.PathLike], header: bool = False,
+                closure: bool = False, engine: str = 'dfs') -> CompiledGraph:
+    # csv (строка, путь, файл или mmap) -> двоичный файл графа
+    graph = load_graph(source, header)
+    save_binary(graph, path, closure, engine)
+    return graph
+
+
+# Движки транзитивного замыкания: строки матрицы хранятся как битовые
+# множества (int), бит j строки i означает путь i -> j длины >= 1.
+CLOSURE_ENGINES = ('dfs', 'warshall')
+
+
+def _adjacency_rows(n: int, edges: Iterable[Tuple[int, int]]) -> List[int]:
+    rows = [0] * n
+    for i, j in edges:
+        rows[i] |= 1 << j
+    return rows
+
+
+def _closure_warshall(rows: List[int]) -> List[int]:
+    # Уоршелл по строкам: если i достигает k, то достигает и всё, что достигает k
+    reach = list(rows)
+    n = len(reach)
+    for k in range(n):
+        bit_k = 1 << k
+        row_k = reach[k]
+        if not row_k:
+            continue
+        for i in range(n):
+            if reach[i] & bit_k:
+                reach[i] |= row_k
+    return reach
+
+
+def _closure_dfs(rows: List[int]) -> List[int]:
+    # Для DAG: обходим вершины в обратном топологическом порядке,
+    # достижимость вершины = её дети + достижимость детей.
+    n = len(rows)
+    children: List[List[int]] = [[] for _ in range(n)]
+    indeg = [0] * n
+    for i, row in enumerate(rows):
+        while row:
+            low = row & -row
+            j = low.bit_length() - 1
+            children[i].append(j)
+            indeg[j] += 1
+            row ^= low
+
+    order = [i for i in range(n) if indeg[i] == 0]
+    for v in order:
+        for c in children[v]:
+            indeg[c] -= 1
+            if indeg[c] == 0:
+                order.append(c)
+    if len(order) != n:
+        # в графе есть цикл — обход по топологическому порядку невозможен
+        return _closure_warshall(rows)
+
+    reach = [0] * n
+    for v in reversed(order):
+        acc = rows[v]
+        for c in children[v]:
+            acc |= reach[c]
+        reach[v] = acc
+    return reach
+
+
+# Состояние процесса-исполнителя для _closure_parallel: задаётся один раз
+# при запуске процесса, дальше задания — только границы блоков
+_closure_shared: Optional[Tuple[Any, Any, Any, Any, List[int]]] = None
+
+
+def _closure_matrix(buf: memoryview, n: int) -> Any:
+    # строки замыкания как uint64 поверх общей памяти, без копирования:
+    # бит j строки — разряд j % 64 слова j // 64
+    return np.frombuffer(buf, dtype='<u8', count=n * _closure_words(n)).reshape(n, -1)
+
+
+def _closure_words(n: int) -> int:
+    return max(1, (n + 63) // 64)
+
+
+def _closure_block(M: Any, indptr: Any, indices: Any, order: List[int], lo: int, hi: int) -> None:
+    # строки вершин order[lo:hi] пишутся прямо в M; строки их детей уже там
+    one = np.uint64(1)
+    for v in order[lo:hi]:
+        kids = indices[indptr[v]:indptr[v + 1]]
+        if len(kids):
+            row = M[v]
+            np.bitwise_or.reduce(M[kids], axis=0, out=row)
+            np.bitwise_or.at(row, kids >> 6, one << (kids & 63).astype(np.uint64))
+
+
+def _closure_worker_init(shm_name: str, n: int, indptr: Any, indices: Any, order: List[int]) -> None:
+    global _closure_shared
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _closure_shared = (shm, _closure_matrix(shm.buf, n), indptr, indices, order)
+
+
+def _closure_worker(lo: int, hi: int) -> None:
+    _, M, indptr, indices, order = _closure_shared
+    _closure_block(M, indptr, indices, order, lo, hi)
+
+
+def _closure_parallel(rows: List[int], max_workers: Optional[int] = None,
+                      min_level: int = 256) -> List[int]:
+    """
+    Транзитивное замыкание DAG на нескольких процессах (нужен numpy).
+
+    Битовая матрица (n строк по ceil(n/64) слов uint64) лежит в
+    shared_memory, процессы видят её как массив numpy без копирования.
+    Вершины разбиты на уровни по высоте: у стоков 0, у остальных на один
+    больше, чем у самого высокого ребёнка. Строка вершины — OR строк её
+    детей и их собственных битов, поэтому вершины одного уровня независимы:
+    уровень режется на блоки по числу процессов, между уровнями — ожидание
+    всех блоков. Уровни меньше min_level считаются в текущем процессе по той
+    же матрице. Результат совпадает с _closure_dfs.
+
+    В CLOSURE_ENGINES не входит: на одном ядре пул процессов только
+    добавляет накладные расходы, а на нескольких ядрах выигрыш не замерялся.
+    Без numpy, с одним процессом (max_workers=1 или одно ядро) и без уровней
+    шире min_level считается обычный _closure_dfs.
+    """
+    workers = max_workers or os.cpu_count() or 1
+    if workers == 1 or np is None:
+        return _closure_dfs(rows)
+
+    n = len(rows)
+    children: List[List[int]] = [list(_iter_bits(row)) for row in rows]
+    indeg = [0] * n
+    for targets in children:
+        for c in targets:
+            indeg[c] += 1
+
+    order = [i for i in range(n) if indeg[i] == 0]
+    for v in order:
+        for c in children[v]:
+            indeg[c] -= 1
+            if indeg[c] == 0:
+                order.append(c)
+    if len(order) != n:
+        # в графе есть цикл — как и в _closure_dfs, считаем Уоршеллом
+        return _closure_warshall(rows)
+
+    height = [0] * n
+    for v in reversed(order):
+        for c in children[v]:
+            if height[c] + 1 > height[v]:
+                height[v] = height[c] + 1
+    levels: List[List[int]] = [[] for _ in range(max(height, default=-1) + 1)]
+    for v in range(n):
+        levels[height[v]].append(v)
+    if all(len(level) < min_level for level in levels):
+        return _closure_dfs(rows)
+
+    by_level = [v for level in levels for v in level]
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum([len(targets) for targets in children], out=indptr[1:])
+    indices = np.fromiter((c for targets in children for c in targets), dtype=np.int64, count=int(indptr[-1]))
+
+    width = 8 * _closure_words(n)
+    shm = shared_memory.SharedMemory(create=True, size=n * width or 1)
+    M = None
+    try:
+        # новая общая память уже заполнена нулями
+        M = _closure_matrix(shm.buf, n)
+        pool: Optional[ProcessPoolExecutor] = None
+        try:
+            lo = 0
+            for level in levels:
+                hi = lo + len(level)
+                if hi - lo < min_level:
+                    _closure_block(M, indptr, indices, by_level, lo, hi)
+                else:
+                    if pool is None:
+                        pool = ProcessPoolExecutor(
+                            max_workers=workers, initializer=_closure_worker_init,
+                            initargs=(shm.name, n, indptr, indices, by_level))
+                    step = -(-(hi - lo) // workers)
+                    futures = [pool.submit(_closure_worker, a, min(a + step, hi))
+                               for a in range(lo, hi, step)]
+                    for future in futures:
+                        future.result()
+                lo = hi
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        data = M.tobytes()
+        return [int.from_bytes(data[v * width:(v + 1) * width], 'little') for v in range(n)]
+    finally:
+        # вид numpy держит буфер общей памяти, его нужно отпустить до close()
+        del M
+        shm.close()
+        shm.unlink()
+
+
+def _transitive_closure(rows: List[int], engine: str = 'dfs') -> List[int]:
+    if engine == 'dfs':
+        return _closure_dfs(rows)
+    if engine == 'warshall':
+        return _closure_warshall(rows)
+    raise ValueError(f"Неизвестный движок замыкания: {engine!r}, ожидался один из {CLOSURE_ENGINES}")
+
+
+def _transpose_rows(rows: List[int], n: int) -> List[int]:
+    cols = [0] * n
+    for i, row in enumerate(rows):
+        bit_i = 1 << i
+        while row:
+            low = row & -row
+            cols[low.bit_length() - 1] |= bit_i
+            row ^= low
+    return cols
+
+
+def _rows_to_matrix(rows: List[int], n: int) -> List[List[bool]]:
+    # bin() даёт старшие биты первыми, поэтому разворачиваем строку
+    matrix = []
+    for row in rows:
+        bits = bin(row)[2:].zfill(n)[::-1]
+        matrix.append([ch == '1' for ch in bits])
+    return matrix
+
+
+def _iter_bits(row: int) -> Iterator[int]:
+    # номера установленных битов по возрастанию
+    while row:
+        low = row & -row
+        yield low.bit_length() - 1
+        row ^= low
+
+
+class _ReachIndex:
+    """
+    Индекс достижимости для r3/r4.
+
+    Для леса (у каждой вершины не больше одного начальника, циклов нет)
+    хранятся только интервалы обхода в глубину: j — потомок i, если
+    tin[i] < tin[j] < tout[i]. Это O(n) памяти и O(1) на запрос.
+    Иначе используется замыкание в виде битовых строк.
+    """
+
+    __slots__ = ('parent', 'tin', 'tout', 'order', 'reach', 'reach_t')
+
+    def __init__(self, graph: CompiledGraph, children: List[List[int]],
+                 indeg: List[int], engine: str) -> None:
+        n = len(graph.nodes)
+        self.parent = graph.parent
+        self.tin: List[int] = []
+        self.tout: List[int] = []
+        self.order: List[int] = []
+        self.reach: List[int] = []
+        self.reach_t: List[int] = []
+
+        if all(d <= 1 for d in indeg):
+            tin = [-1] * n
+            tout = [0] * n
+            order: List[int] = []
+            for root in range(n):
+                if indeg[root] != 0:
+                    continue
+                tin[root] = len(order)
+                order.append(root)
+                stack = [(root, iter(children[root]))]
+                while stack:
+                    v, it = stack[-1]
+                    c = next(it, None)
+                    if c is None:
+                        tout[v] = len(order)
+                        stack.pop()
+                    else:
+                        tin[c] = len(order)
+                        order.append(c)
+                        stack.append((c, iter(children[c])))
+            if len(order) == n:
+                self.tin, self.tout, self.order = tin, tout, order
+                return
+
+        # не лес — храним полное замыкание
+        if graph.closure is not None:
+            self.reach = list(graph.closure)
+        else:
+            self.reach = _transitive_closure(_adjacency_rows(n, graph.edges), engine)
+        self.reach_t = _transpose_rows(self.reach, n)
+
+    def reaches(self, i: int, j: int) -> bool:
+        if self.tin:
+            return self.tin[i] < self.tin[j] < self.tout[i]
+        return bool(self.reach[i] >> j & 1)
+
+    def descendants(self, i: int) -> List[int]:
+        if self.tin:
+            return sorted(self.order[self.tin[i] + 1:self.tout[i]])
+        return list(_iter_bits(self.reach[i]))
+
+    def ancestors(self, i: int) -> List[int]:
+        if self.tin:
+            result = []
+            p = self.parent[i]
+            while p != -1:
+                result.append(p)
+                p = self.parent[p]
+            result.sort()
+            return result
+        return list(_iter_bits(self.reach_t[i]))
+
+
+class Relations:
+    """
+    Компактное представление отношений r1–r5 без плотных матриц n×n.
+
+    r1/r2 — списки смежности в формате CSR (indptr/indices),
+    r5    — группы соподчинённых (дети одного начальника),
+    r3/r4 — индекс достижимости.
+
+    related(kind, a, b) и row(kind, a) работают по именам вершин,
+    плотные матрицы строятся только в to_dense().
+    """
+
+    KINDS = ('r1', 'r2', 'r3', 'r4', 'r5')
+
+    def __init__(self, graph: CompiledGraph, engine: str = 'dfs') -> None:
+        n = len(graph.nodes)
+        self.graph = graph
+        self.n = n
+
+        children: List[List[int]] = [[] for _ in range(n)]
+        parents: List[List[int]] = [[] for _ in range(n)]
+        for i, j in graph.edges:
+            children[i].append(j)
+            parents[j].append(i)
+
+        self.out_indptr, self.out_indices = self._csr(children)
+        self.in_indptr, self.in_indices = self._csr(parents)
+
+        # группы соподчинённых: начальник -> отсортированные подчинённые
+        self.siblings: Dict[int, List[int]] = {}
+        for v, p in enumerate(graph.parent):
+            if p != -1:
+                self.siblings.setdefault(p, []).append(v)
+
+        self._reach = _ReachIndex(graph, children, [len(ps) for ps in parents], engine)
+
+    @staticmethod
+    def _csr(adj: List[List[int]]) -> Tuple[List[int], List[int]]:
+        indptr = [0]
+        indices: List[int] = []
+        for targets in adj:
+            indices.extend(sorted(targets))
+            indptr.append(len(indices))
+        return indptr, indices
+
+    def _kind(self, kind: Union[str, int]) -> str:
+        if isinstance(kind, int):
+            kind = f'r{kind}'
+        if kind not in self.KINDS:
+            raise ValueError(f"Неизвестное отношение: {kind!r}, ожидалось одно из {self.KINDS}")
+        return kind
+
+    def _out(self, i: int) -> List[int]:
+        return self.out_indices[self.out_indptr[i]:self.out_indptr[i + 1]]
+
+    def _in(self, i: int) -> List[int]:
+        return self.in_indices[self.in_indptr[i]:self.in_indptr[i + 1]]
+
+    def _related(self, kind: str, i: int, j: int) -> bool:
+        if kind == 'r1':
+            return j in self._out(i)
+        if kind == 'r2':
+            return j in self._in(i)
+        if kind == 'r3':
+            return self._reach.reaches(i, j) and j not in self._out(i)
+        if kind == 'r4':
+            return self._reach.reaches(j, i) and j not in self._in(i)
+        p = self.graph.parent[i]
+        return i != j and p != -1 and p == self.graph.parent[j]
+
+    def _row(self, kind: str, i: int) -> List[int]:
+        if kind == 'r1':
+            return self._out(i)
+        if kind == 'r2':
+            return self._in(i)
+        if kind == 'r3':
+            direct = set(self._out(i))
+            return [j for j in self._reach.descendants(i) if j not in direct]
+        if kind == 'r4':
+            direct = set(self._in(i))
+            return [j for j in self._reach.ancestors(i) if j not in direct]
+        p = self.graph.parent[i]
+        if p == -1:
+            return []
+        return [j for j in self.siblings[p] if j != i]
+
+    def related(self, kind: Union[str, int], a: str, b: str) -> bool:
+        index = self.graph.index
+        return self._related(self._kind(kind), index[a], index[b])
+
+    def row(self, kind: Union[str, int], a: str) -> Iterator[str]:
+        nodes = self.graph.nodes
+        for j in self._row(self._kind(kind), self.graph.index[a]):
+            yield nodes[j]
+
+    def to_dense(self, kind: Union[str, int]) -> List[List[bool]]:
+        kind = self._kind(kind)
+        n = self.n
+        matrix = [[False] * n for _ in range(n)]
+        for i in range(n):
+            row = matrix[i]
+            for j in self._row(kind, i):
+                row[j] = True
+        return matrix
+
+    def to_dense_all(self) -> Tuple[List[List[bool]], ...]:
+        return tuple(self.to_dense(kind) for kind in self.KINDS)
+
+
+def _normalize_csv(csv_string: str) -> str:
+    # те же пары, что видит CompiledGraph.from_csv: лишние столбцы не влияют
+    return '\n'.join(','.join(edge.split(',')[:2]) for edge in csv_string.strip().split('\n'))
+
+
+def main(E: Union[str, CompiledGraph], e: str, engine: str = 'dfs',
+         output: str = 'dense', profile: Optional[Profile] = None,
+         cache: Optional[ResultCache] = None) -> Union[Tuple[
     List[List[bool]],
     List[List[bool]], 
     List[List[bool]],
     List[List[bool]],
     List[List[bool]]
-]:
-    # Разбиваем строку на список рёбер
-    edges = E.strip().split('\n')
-    
-    # Множество для уникальных вершин
-    nodes_set = set()
-    for edge in edges:
-        parts = edge.split(',')
-        nodes_set.add(parts[0])
-        nodes_set.add(parts[1])
-    
-    # Сортировка вершин
-    nodes_list = sorted(list(nodes_set))
-    n = len(nodes_list)
-    
-    # Матрица смежности исходного ориентированного графа
-    adj_matrix = [[0] * n for _ in range(n)]
-    
-    # Заполнение матрицы смежности
-    for edge in edges:
-        parts = edge.split(',')
-        u = parts[0]
-        v = parts[1]
-        i = nodes_list.index(u)
-        j = nodes_list.index(v)
-        adj_matrix[i][j] = 1
+], Relations]:
+    # cache — ResultCache: повтор тех же входов берёт готовые матрицы.
+    # Матрицы от движка и e не зависят, поэтому в ключ входит только граф
+    if cache is not None and isinstance(E, str) and output == 'dense':
+        if engine not in CLOSURE_ENGINES:
+            raise ValueError(f"Неизвестный движок замыкания: {engine!r}, ожидался один из {CLOSURE_ENGINES}")
+        key = cache.key('task1', _normalize_csv(E))
+        hit, result = cache.get(key)
+        if not hit:
+            result = main(E, e, engine, output, profile)
+            cache.put(key, result)
+        return result
+
+    # profile — Profile для замеров по этапам (None — без замеров)
+    if profile is not None:
+        profile.start()
+
+    graph = _as_graph(E)
+    n = len(graph.nodes)
+    if profile is not None:
+        profile.lap('parse', n=n, E=len(graph.edges))
+
+    # output='sparse' — компактные отношения без матриц n×n
+    if output == 'sparse':
+        relations = Relations(graph, engine)
+        if profile is not None:
+            profile.lap('relations')
+        return relations
+    if output != 'dense':
+        raise ValueError(f"Неизвестный формат результата: {output!r}, ожидался 'dense' или 'sparse'")
     
+    # Матрица смежности исходного графа в виде битовых строк
+    r1_rows = _adjacency_rows(n, graph.edges)
+    r2_rows = _transpose_rows(r1_rows, n)
+    if profile is not None:
+        profile.lap('adjacency')
+
     # r1 - отношение непосредственного управления 
-    r1 = [[False] * n for _ in range(n)]
-    for i in range(n):
-        for j in range(n):
-            r1[i][j] = bool(adj_matrix[i][j])
+    r1 = _rows_to_matrix(r1_rows, n)
     
     # r2 - отношение непосредственного подчинения 
-    r2 = [[False] * n for _ in range(n)]
-    for i in range(n):
-        for j in range(n):
-            r2[i][j] = bool(adj_matrix[j][i])
-    
-    # r3 - отношение опосредованного управления 
-    r3 = [[False] * n for _ in range(n)]
-    # Используем алгоритм Флойда-Уоршелла
-    # Сначала копируем r1
-    for i in range(n):
-        for j in range(n):
-            r3[i][j] = r1[i][j]
+    r2 = _rows_to_matrix(r2_rows, n)
+    if profile is not None:
+        profile.lap('r1_r2', cells=2 * n * n)
     
-    # поиск транзитивного замыкания
-    for k in range(n):
-        for i in range(n):
-            for j in range(n):
-                r3[i][j] = r3[i][j] or (r3[i][k] and r3[k][j])
+    # Достижимость по r1 (транзитивное замыкание); из двоичного файла — готовая
+    if graph.closure is not None:
+        reach = list(graph.closure)
+    else:
+        reach = _transitive_closure(r1_rows, engine)
+    if profile is not None:
+        profile.lap('closure', engine=engine)
 
-    for i in range(n):
-        for j in range(n):
-            if r1[i][j]:
-                r3[i][j] = False
+    # r3 - отношение опосредованного управления 
+    # (замыкание r1 без прямых связей)
+    r3 = _rows_to_matrix([reach[i] & ~r1_rows[i] for i in range(n)], n)
+    if profile is not None:
+        profile.lap('r3')
     
     # r4 - отношение опосредованного подчинения 
-    r4 = [[False] * n for _ in range(n)]
-    # копирую r2
-    for i in range(n):
-        for j in range(n):
-            r4[i][j] = r2[i][j]
-    
-    # поиск транзитивного замыкание
-    for k in range(n):
-        for i in range(n):
-            for j in range(n):
-                r4[i][j] = r4[i][j] or (r4[i][k] and r4[k][j])
-    
+    # замыкание r2 = транспонированное замыкание r1, повторно его не считаем
+    reach_t = _transpose_rows(reach, n)
     # Убираю прямые подчинения (они уже в r2)
-    for i in range(n):
-        for j in range(n):
-            if r2[i][j]:
-                r4[i][j] = False
+    r4 = _rows_to_matrix([reach_t[i] & ~r2_rows[i] for i in range(n)], n)
+    if profile is not None:
+        profile.lap('r4')
     
     # r5 - отношение соподчинения 
     r5 = [[False] * n for _ in range(n)]
     
-    # Нахожу для каждой вершины её родителя
-    parent = {}
-    for edge in edges:
-        u, v = edge.split(',')
-        parent[v] = u
+    # Для каждой вершины номер её родителя (-1 у корня)
+    parent = graph.parent
     
     # Две вершины соподчинены, если у них одинаковый непосредственный начальник
     for i in range(n):
         for j in range(n):
-            if i != j:
-                node_i = nodes_list[i]
-                node_j = nodes_list[j]
-                if (node_i in parent and node_j in parent and 
-                    parent[node_i] == parent[node_j]):
-                    r5[i][j] = True
+            if i != j and parent[i] != -1 and parent[i] == parent[j]:
+                r5[i][j] = True
+    if profile is not None:
+        profile.lap('r5')
     
     return (r1, r2, r3, r4, r5)
 
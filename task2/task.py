@@ -1,34 +1,39 @@
 # -*- coding: utf-8 -*-
 
+import argparse
+import json
 import math
-from typing import Tuple
+import os
+import pathlib
+import sys
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
 
-def main(s: str, e: str) -> Tuple[float, float]:
-    # Разбиваем строку на список рёбер
-    edges = s.strip().split('\n')
-    
-    # Множество для уникальных вершин
-    nodes_set = set()
-    for edge in edges:
-        parts = edge.split(',')
-        nodes_set.add(parts[0])
-        nodes_set.add(parts[1])
-    
-    # Сортировка вершин
-    nodes_list = sorted(list(nodes_set))
+# общий код задач лежит в common/ в корне репозитория
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _ROOT not in sys.path:
+    sys.path.insert(0, _ROOT)
+
+from common.cache import ResultCache
+from common.graph import (CompiledGraph, as_graph as _as_graph, compile_graph, convert_csv, iter_edges,
+                          load_binary, load_graph, save_binary)
+from common.profile import Profile
+
+
+def _relation_counts_matrix(graph: CompiledGraph, profile: Optional[Profile] = None) -> List[List[int]]:
+    # Исходный способ: строим r1–r5 как матрицы n×n и считаем связи
+    nodes_list = graph.nodes
     n = len(nodes_list)
     
     # Матрица смежности исходного ориентированного графа
     adj_matrix = [[0] * n for _ in range(n)]
     
     # Заполнение матрицы смежности
-    for edge in edges:
-        parts = edge.split(',')
-        u = parts[0]
-        v = parts[1]
-        i = nodes_list.index(u)
-        j = nodes_list.index(v)
+    for i, j in graph.edges:
         adj_matrix[i][j] = 1
+    if profile is not None:
+        profile.lap('adjacency', cells=n * n)
     
     # r1 - отношение непосредственного управления 
     r1 = [[False] * n for _ in range(n)]
@@ -41,6 +46,8 @@ def main(s: str, e: str) -> Tuple[float, float]:
     for i in range(n):
         for j in range(n):
             r2[i][j] = bool(adj_matrix[j][i])
+    if profile is not None:
+        profile.lap('r1_r2')
     
     # r3 - отношение опосредованного управления 
     r3 = [[False] * n for _ in range(n)]
@@ -60,6 +67,8 @@ def main(s: str, e: str) -> Tuple[float, float]:
         for j in range(n):
             if r1[i][j]:
                 r3[i][j] = False
+    if profile is not None:
+        profile.lap('r3')
     
     # r4 - отношение опосредованного подчинения 
     r4 = [[False] * n for _ in range(n)]
@@ -79,27 +88,23 @@ def main(s: str, e: str) -> Tuple[float, float]:
         for j in range(n):
             if r2[i][j]:
                 r4[i][j] = False
+    if profile is not None:
+        profile.lap('r4')
     
     # r5 - отношение соподчинения 
     r5 = [[False] * n for _ in range(n)]
     
-    # Нахожу для каждой вершины её родителя
-    parent = {}
-    for edge in edges:
-        u, v = edge.split(',')
-        parent[v] = u
+    # Для каждой вершины номер её родителя (-1 у корня)
+    parent = graph.parent
     
     # Две вершины соподчинены, если у них одинаковый непосредственный начальник
     for i in range(n):
         for j in range(n):
-            if i != j:
-                node_i = nodes_list[i]
-                node_j = nodes_list[j]
-                if (node_i in parent and node_j in parent and 
-                    parent[node_i] == parent[node_j]):
-                    r5[i][j] = True
-    
-    # Расчёт количества исходящих связей для каждого элемента
+            if i != j and parent[i] != -1 and parent[i] == parent[j]:
+                r5[i][j] = True
+    if profile is not None:
+        profile.lap('r5')
+    
     k = 5  # количество типов отношений
     l_ij = [[0] * k for _ in range(n)]  # l_ij[элемент][отношение]
     
@@ -117,7 +122,81 @@ def main(s: str, e: str) -> Tuple[float, float]:
                     l_ij[i][3] += 1  # r4
                 if r5[i][j]:
                     l_ij[i][4] += 1  # r5
+    if profile is not None:
+        profile.lap('counts', method='matrix')
     
+    return l_ij
+
+
+def _forest_counts(graph: CompiledGraph) -> Tuple[List[List[int]], List[List[int]], List[int], List[int]]:
+    """
+    Количество исходящих связей каждого типа для леса, за O(V+E).
+
+        r1 — число детей,
+        r2 — число начальников,
+        r3 — размер поддерева без самой вершины и её детей,
+        r4 — глубина вершины минус один,
+        r5 — число остальных детей того же начальника.
+
+    Возвращает (l_ij, children, depth, size): глубина корня 0, размер
+    поддерева считает и саму вершину. Если граф не лес — ValueError.
+    """
+    n = len(graph.nodes)
+    children: List[List[int]] = [[] for _ in range(n)]
+    indeg = [0] * n
+    for i, j in graph.edges:
+        children[i].append(j)
+        indeg[j] += 1
+
+    if any(d > 1 for d in indeg):
+        raise ValueError("Иерархия должна быть лесом: у вершины несколько начальников")
+
+    # обход от корней в ширину, заодно глубины
+    depth = [0] * n
+    order = [i for i in range(n) if indeg[i] == 0]
+    for v in order:
+        for ch in children[v]:
+            depth[ch] = depth[v] + 1
+            order.append(ch)
+    if len(order) != n:
+        raise ValueError("Иерархия должна быть лесом: в графе есть цикл")
+
+    # размеры поддеревьев снизу вверх
+    size = [1] * n
+    for v in reversed(order):
+        for ch in children[v]:
+            size[v] += size[ch]
+
+    parent = graph.parent
+    l_ij = []
+    for i in range(n):
+        n_children = len(children[i])
+        p = parent[i]
+        l_ij.append([
+            n_children,
+            indeg[i],
+            size[i] - 1 - n_children,
+            depth[i] - 1 if depth[i] > 1 else 0,
+            len(children[p]) - 1 if p != -1 else 0,
+        ])
+    return l_ij, children, depth, size
+
+
+def _relation_counts(graph: CompiledGraph, profile: Optional[Profile] = None) -> List[List[int]]:
+    # Быстрый подсчёт по дереву; если граф не лес (несколько начальников
+    # или цикл), считаем по матрицам
+    try:
+        l_ij = _forest_counts(graph)[0]
+    except ValueError:
+        return _relation_counts_matrix(graph, profile)
+    if profile is not None:
+        profile.lap('counts', method='tree')
+    return l_ij
+
+
+def _entropy(l_ij: List[List[int]], n: int) -> Tuple[float, float]:
+    k = 5  # количество типов отношений
+
     # Расчёт энтропии
     H_total = 0.0
     max_connections = n - 1  # максимальное число уникальных связей от одного элемента
@@ -143,3 +222,362 @@ def main(s: str, e: str) -> Tuple[float, float]:
     
     return (H_total_rounded, h_norm_rounded)
 
+
+def _l_log_l(l: int) -> float:
+    return l * math.log2(l) if l > 0 else 0.0
+
+
+def _near_rounding_edge(x: float) -> bool:
+    # x·10 близко к половине: round(x, 1) чувствителен к погрешности суммы
+    frac = x * 10 - math.floor(x * 10)
+    return abs(frac - 0.5) <= 1e-6 * max(1.0, abs(x * 10))
+
+
+class Hierarchy:
+    """
+    Изменяемая иерархия (лес) с пересчётом энтропии по мере изменений.
+
+    Для каждой вершины хранятся числа связей r1–r5 (как l_ij в main()),
+    размер поддерева и глубина. Энтропия считается через две суммы:
+
+        S0 = Σ l,   S1 = Σ l·log2(l),
+        H  = -Σ (l/N)·log2(l/N) = (S0·log2(N) - S1) / N,   N = n - 1,
+
+    поэтому после изменения достаточно поправить только затронутые l.
+    Вершины без рёбер удаляются, как если бы граф заново читался из csv.
+    Порядок суммирования другой, чем в main(), поэтому вблизи границы
+    округления entropy() пересчитывает H за O(n) тем же способом, что и main().
+    """
+
+    def __init__(self) -> None:
+        self.parent: Dict[str, Optional[str]] = {}
+        self.children: Dict[str, Set[str]] = {}
+        self.size: Dict[str, int] = {}
+        self.depth: Dict[str, int] = {}
+        self.counts: Dict[str, List[int]] = {}
+        self._s0 = 0
+        self._s1 = 0.0
+
+    @classmethod
+    def from_graph(cls, source: Union[str, CompiledGraph]) -> 'Hierarchy':
+        # счётчики, размеры и глубины — одним проходом, как в main(), за O(V+E)
+        graph = _as_graph(source)
+        l_ij, children, depth, size = _forest_counts(graph)
+        nodes = graph.nodes
+        h = cls()
+        for i, name in enumerate(nodes):
+            p = graph.parent[i]
+            h.parent[name] = nodes[p] if p != -1 else None
+            h.children[name] = {nodes[c] for c in children[i]}
+            h.size[name] = size[i]
+            h.depth[name] = depth[i]
+            h.counts[name] = l_ij[i]
+        h._s0 = sum(l for row in l_ij for l in row)
+        h._s1 = sum(_l_log_l(l) for row in l_ij for l in row)
+        return h
+
+    def __len__(self) -> int:
+        return len(self.parent)
+
+    def __contains__(self, node: str) -> bool:
+        return node in self.parent
+
+    # --- служебное ---
+
+    def _set(self, node: str, rel: int, value: int) -> None:
+        row = self.counts[node]
+        old = row[rel]
+        if old == value:
+            return
+        row[rel] = value
+        self._s0 += value - old
+        self._s1 += _l_log_l(value) - _l_log_l(old)
+
+    def _add(self, node: str, rel: int, delta: int) -> None:
+        self._set(node, rel, self.counts[node][rel] + delta)
+
+    def _ensure(self, node: str) -> None:
+        if node not in self.parent:
+            self.parent[node] = None
+            self.children[node] = set()
+            self.size[node] = 1
+            self.depth[node] = 0
+            self.counts[node] = [0] * 5
+
+    def _drop_if_isolated(self, node: str) -> None:
+        if self.parent[node] is None and not self.children[node]:
+            del self.parent[node], self.children[node], self.size[node], self.depth[node]
+            del self.counts[node]
+
+    def _ancestors(self, node: str) -> Iterator[str]:
+        p = self.parent[node]
+        while p is not None:
+            yield p
+            p = self.parent[p]
+
+    def _subtree(self, node: str) -> Iterator[str]:
+        stack = [node]
+        while stack:
+            v = stack.pop()
+            yield v
+            stack.extend(self.children[v])
+
+    def _shift_depth(self, node: str, delta: int) -> None:
+        for v in self._subtree(node):
+            d = self.depth[v] + delta
+            self.depth[v] = d
+            self._set(v, 3, d - 1 if d > 1 else 0)  # r4
+
+    # --- изменения ---
+
+    def add_edge(self, u: str, v: str) -> None:
+        """Подчинить v вершине u (у v не должно быть начальника)."""
+        if u == v:
+            raise ValueError("Петля u -> u не допускается")
+        if v in self.parent and self.parent[v] is not None:
+            raise ValueError(f"У вершины {v!r} уже есть начальник {self.parent[v]!r}")
+        if u in self.parent and v in self.parent and \
+                any(a == v for a in self._ancestors(u)):
+            raise ValueError(f"Ребро {u!r} -> {v!r} образует цикл")
+        self._ensure(u)
+        self._ensure(v)
+
+        siblings = self.children[u]
+        # r5: старые дети u получают нового соподчинённого
+        for s in siblings:
+            self._add(s, 4, 1)
+        self._set(v, 4, len(siblings))
+
+        siblings.add(v)
+        self.parent[v] = u
+        self._add(u, 0, 1)  # r1
+        self._set(v, 1, 1)  # r2
+
+        # r3: u получает внуков, выше — всё поддерево v
+        size_v = self.size[v]
+        self.size[u] += size_v
+        self._add(u, 2, size_v - 1)
+        for a in self._ancestors(u):
+            self.size[a] += size_v
+            self._add(a, 2, size_v)
+
+        # r4: поддерево v опускается на глубину u + 1
+        self._shift_depth(v, self.depth[u] + 1)
+
+    def remove_edge(self, u: str, v: str) -> None:
+        """Убрать подчинение v вершине u; v становится корнем."""
+        if u not in self.parent or self.parent.get(v) != u:
+            raise ValueError(f"Ребра {u!r} -> {v!r} нет в иерархии")
+
+        self._shift_depth(v, -self.depth[v])
+
+        size_v = self.size[v]
+        self.size[u] -= size_v
+        self._add(u, 2, -(size_v - 1))
+        for a in self._ancestors(u):
+            self.size[a] -= size_v
+            self._add(a, 2, -size_v)
+
+        siblings = self.children[u]
+        siblings.discard(v)
+        self.parent[v] = None
+        self._add(u, 0, -1)
+        self._set(v, 1, 0)
+        self._set(v, 4, 0)
+        for s in siblings:
+            self._add(s, 4, -1)
+
+        self._drop_if_isolated(u)
+        self._drop_if_isolated(v)
+
+    def move_subtree(self, v: str, new_parent: str) -> None:
+        """Переподчинить v (вместе с поддеревом) вершине new_parent."""
+        if new_parent == v or (new_parent in self.parent and
+                               any(a == v for a in self._ancestors(new_parent))):
+            raise ValueError(f"Нельзя подчинить {v!r} собственному потомку {new_parent!r}")
+        old = self.parent.get(v)
+        if old == new_parent:
+            return
+        if old is not None:
+            self.remove_edge(old, v)
+        self.add_edge(new_parent, v)
+
+    # --- результат ---
+
+    def entropy(self) -> Tuple[float, float]:
+        """Текущие (H, h_norm), округлённые так же, как в main()."""
+        n = len(self.parent)
+        k = 5
+        if n <= 1:
+            return (0.0, 0.0)
+        N = n - 1
+        H_total = (self._s0 * math.log2(N) - self._s1) / N
+        c = 1 / (math.e * math.log(2))
+        h_norm = H_total / (c * n * k)
+        if _near_rounding_edge(H_total) or _near_rounding_edge(h_norm):
+            # суммы накоплены в другом порядке и могут округлиться не в ту
+            # сторону: считаем как main() — по вершинам в порядке имён
+            return _entropy([self.counts[v] for v in sorted(self.counts)], n)
+        return (round(H_total, 1), round(h_norm, 1))
+
+    def edges(self) -> List[Tuple[str, str]]:
+        return [(p, v) for v, p in self.parent.items() if p is not None]
+
+    def to_csv(self) -> str:
+        return '\n'.join(f'{u},{v}' for u, v in self.edges())
+
+
+def _normalize_csv(csv_string: str) -> str:
+    # те же пары, что видит CompiledGraph.from_csv: лишние столбцы не влияют
+    return '\n'.join(','.join(edge.split(',')[:2]) for edge in csv_string.strip().split('\n'))
+
+
+def main(s: Union[str, CompiledGraph], e: str, method: str = 'counts',
+         profile: Optional[Profile] = None, cache: Optional[ResultCache] = None) -> Tuple[float, float]:
+    # cache — ResultCache: повтор тех же входов берёт готовый результат.
+    # Оба способа подсчёта дают одно и то же, e не используется — в ключе только граф
+    if cache is not None and isinstance(s, str):
+        if method not in ('counts', 'matrix'):
+            raise ValueError(f"Неизвестный способ подсчёта: {method!r}, ожидался 'counts' или 'matrix'")
+        key = cache.key('task2', _normalize_csv(s))
+        hit, result = cache.get(key)
+        if not hit:
+            result = main(s, e, method, profile)
+            cache.put(key, result)
+        return result
+
+    # profile — Profile для замеров по этапам (None — без замеров)
+    if profile is not None:
+        profile.start()
+
+    graph = _as_graph(s)
+    n = len(graph.nodes)
+    if profile is not None:
+        profile.lap('parse', n=n, E=len(graph.edges))
+
+    # method='counts' — быстрый подсчёт по дереву, 'matrix' — через матрицы r1–r5
+    if method == 'counts':
+        l_ij = _relation_counts(graph, profile)
+    elif method == 'matrix':
+        l_ij = _relation_counts_matrix(graph, profile)
+    else:
+        raise ValueError(f"Неизвестный способ подсчёта: {method!r}, ожидался 'counts' или 'matrix'")
+
+    result = _entropy(l_ij, n)
+    if profile is not None:
+        profile.lap('entropy')
+    return result
+
+
+# --- Пакетный подсчёт энтропии ---
+
+GraphSource = Union[str, os.PathLike, CompiledGraph]
+
+
+def _load_source(source: GraphSource) -> CompiledGraph:
+    # Пути читаются уже в рабочем процессе: csv — потоково, *.cgr — двоичный
+    # файл графа (save_binary). Граф строится в обход compile_graph: кэш
+    # держал бы в каждом процессе последние 32 строки и графа, а в пакетном
+    # подсчёте графы не повторяются
+    if isinstance(source, CompiledGraph):
+        return source
+    if isinstance(source, str):
+        return CompiledGraph.from_csv(source)
+    if os.fspath(source).endswith('.cgr'):
+        return load_binary(source)
+    return load_graph(source)
+
+
+def _score_chunk(chunk: List[Tuple[Any, GraphSource]]) -> List[Tuple[Any, float, float]]:
+    results = []
+    for graph_id, source in chunk:
+        H, h_norm = main(_load_source(source), '')
+        results.append((graph_id, H, h_norm))
+    return results
+
+
+def _chunked(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _with_ids(graphs: Iterable[Any]) -> Iterator[Tuple[Any, GraphSource]]:
+    # Элемент — либо источник графа, либо пара (id, источник)
+    for i, item in enumerate(graphs):
+        if isinstance(item, tuple) and len(item) == 2:
+            yield item
+        else:
+            yield (i, item)
+
+
+def score_many(graphs: Iterable[Any], max_workers: Optional[int] = None,
+               chunksize: int = 16, max_pending: Optional[int] = None
+               ) -> Iterator[Tuple[Any, float, float]]:
+    """
+    Энтропия для множества графов: выдаёт (id, H, h_norm) в порядке входа.
+
+    graphs      — строки csv, пути к файлам (Path) или пары (id, источник);
+    max_workers — размер пула процессов (0 — считать в текущем процессе);
+    chunksize   — сколько графов отправлять в процесс за раз;
+    max_pending — сколько пачек может быть в работе одновременно
+                  (ограничивает память, по умолчанию 2 * max_workers).
+    """
+    if chunksize < 1:
+        raise ValueError("chunksize должен быть положительным")
+    chunks = _chunked(_with_ids(graphs), chunksize)
+
+    if max_workers == 0:
+        for chunk in chunks:
+            yield from _score_chunk(chunk)
+        return
+
+    workers = max_workers or os.cpu_count() or 1
+    limit = max_pending or 2 * workers
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending: Deque[Future] = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(_score_chunk, chunk))
+            if len(pending) >= limit:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def _iter_cli_sources(path: str) -> Iterator[Tuple[Any, GraphSource]]:
+    # Каталог — все *.csv и *.cgr в нём, иначе jsonl со строками {"id": ..., "csv": ...}
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if name.endswith(('.csv', '.cgr')):
+                yield (name, pathlib.Path(path, name))
+        return
+    with open(path, encoding='utf-8') as f:
+        for line_no, line in enumerate(f):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            yield (record.get('id', line_no), record['csv'])
+
+
+def _cli(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Энтропия структуры для набора графов")
+    parser.add_argument('path', help="каталог с *.csv и *.cgr или jsonl-файл с полями id и csv")
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help="число процессов (0 — без пула)")
+    parser.add_argument('--chunksize', type=int, default=16)
+    args = parser.parse_args(argv)
+
+    for graph_id, H, h_norm in score_many(_iter_cli_sources(args.path),
+                                          max_workers=args.workers,
+                                          chunksize=args.chunksize):
+        print(json.dumps({'id': graph_id, 'H': H, 'h_norm': h_norm}, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    _cli()
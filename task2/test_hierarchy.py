@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Сверка инкрементальной Hierarchy с полным пересчётом main(method='matrix')
+после случайных правок иерархии.
+"""
+
+import importlib.util
+import os
+import random
+
+import pytest
+
+_spec = importlib.util.spec_from_file_location(
+    "task2_task", os.path.join(os.path.dirname(os.path.abspath(__file__)), "task.py"))
+task = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(task)
+
+
+def _random_forest(r, n):
+    names = [f"v{i}" for i in range(n)]
+    r.shuffle(names)
+    edges = []
+    for k in range(1, n):
+        if r.random() < 0.85:
+            edges.append((names[r.randrange(k)], names[k]))
+    return edges
+
+
+def _check(h):
+    csv = h.to_csv()
+    if not csv:
+        assert h.entropy() == (0.0, 0.0)
+        return
+    graph = task.CompiledGraph.from_csv(csv)
+    expected = task._relation_counts_matrix(graph)
+    assert {name: expected[i] for i, name in enumerate(graph.nodes)} == h.counts
+    assert h.entropy() == task.main(csv, '', method='matrix')
+
+
+def _mutate(r, h):
+    names = list(h.parent)
+    op = r.random()
+    if op < 0.4 or len(names) < 2:
+        # новая вершина или ребро между корнем и вершиной из другого дерева
+        u = r.choice(names) if names else f"v{r.randrange(10 ** 6)}"
+        v = f"n{r.randrange(10 ** 6)}"
+        above = (set(h._ancestors(u)) if u in h.parent else set()) | {u}
+        roots = [x for x in names if h.parent[x] is None and x not in above]
+        if roots and r.random() < 0.5:
+            v = r.choice(roots)
+        if v not in h.parent or h.parent[v] is None:
+            h.add_edge(u, v)
+    elif op < 0.7:
+        v = r.choice(names)
+        if h.parent[v] is not None:
+            h.remove_edge(h.parent[v], v)
+    else:
+        v = r.choice(names)
+        subtree = set(h._subtree(v))
+        targets = [x for x in names if x not in subtree]
+        if targets:
+            h.move_subtree(v, r.choice(targets))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_mutations_match_matrix(seed):
+    r = random.Random(seed)
+    edges = _random_forest(r, r.randint(2, 40))
+    h = task.Hierarchy.from_graph('\n'.join(f"{u},{v}" for u, v in edges) or "a,b")
+    _check(h)
+    for _ in range(60):
+        _mutate(r, h)
+        _check(h)
+
+
+@pytest.mark.parametrize("shape", ["chain", "star"])
+def test_from_graph_large(shape):
+    # 20000 вершин: повторное add_edge здесь работало бы минуты
+    n = 20000
+    if shape == "chain":
+        csv = '\n'.join(f"n{i},n{i + 1}" for i in range(n - 1))
+    else:
+        csv = '\n'.join(f"r,n{i}" for i in range(n - 1))
+    h = task.Hierarchy.from_graph(csv)
+    assert h.entropy() == task.main(csv, '')
+    graph = task.compile_graph(csv)
+    counts = task._relation_counts(graph)
+    assert {name: counts[i] for i, name in enumerate(graph.nodes)} == h.counts
+
+
+def test_from_graph_rejects_non_forest():
+    with pytest.raises(ValueError, match="несколько начальников"):
+        task.Hierarchy.from_graph("a,c\nb,c")
+    with pytest.raises(ValueError, match="цикл"):
+        task.Hierarchy.from_graph("a,b\nb,a")
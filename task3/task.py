@@ -2,12 +2,32 @@
 
 
 import json
-from typing import List, Dict, Tuple, Union
+import os
+import sys
+from typing import List, Dict, Optional, Tuple, Union
+
+try:
+    import numpy as np
+except ImportError:  # numpy нужен только для engine='numpy'
+    np = None
+
+# общий код задач лежит в common/ в корне репозитория
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _ROOT not in sys.path:
+    sys.path.insert(0, _ROOT)
+
+from common.cache import ResultCache
+from common.profile import Profile
 
 
 RankingItem = Union[int, List[int]]
 
 
+def _normalize_json(json_str: str) -> str:
+    # без пробелов и переносов, порядок ключей сохраняется
+    return json.dumps(json.loads(json_str), ensure_ascii=False, separators=(',', ':'))
+
+
 def _parse_ranking(json_str: str) -> List[RankingItem]:
     """
     Парсинг JSON-строки с кластерной ранжировкой
@@ -21,12 +41,12 @@ def _parse_ranking(json_str: str) -> List[RankingItem]:
     return data
 
 
-def _collect_objects(r1: List[RankingItem], r2: List[RankingItem]) -> List[int]:
+def _collect_objects(*rankings: List[RankingItem]) -> List[int]:
     """
-    Собираем множество всех объектов из двух ранжировок и сортируем их
+    Собираем множество всех объектов из ранжировок и сортируем их
     """
     objs = set()
-    for ranking in (r1, r2):
+    for ranking in rankings:
         for item in ranking:
             if isinstance(item, list):
                 objs.update(item)
@@ -104,7 +124,7 @@ def _find_contradiction_core(
 
     Возвращает:
         - список пар (объект_i, объект_j) в ядре;
-        - матрицу YAB (она пригодится на этапе 2).
+        - матрицу согласованности YAB.
     """
     YAT = _transpose(YA)
     YBT = _transpose(YB)
@@ -128,93 +148,166 @@ def _find_contradiction_core(
     return core_pairs, YAB
 
 
+def _inversion_sweep(
+    objects: List[int],
+    posA: Dict[int, int],
+    posB: Dict[int, int],
+    collect: bool,
+) -> Tuple[int, List[Tuple[int, int]]]:
+    """
+    Ядро противоречий через подсчёт инверсий.
+
+    Пара (x, y) в ядре, если её порядок в A и в B строго противоположный:
+    posA[x] < posA[y] и posB[x] > posB[y] (равные позиции в ядро не попадают).
+    Сортируем объекты по (posA, posB) — тогда ядро = инверсии последовательности
+    posB, и их перечисляет сортировка слиянием (снизу вверх, без рекурсии):
+    когда элемент правой половины обгоняет левую, он образует пару
+    с каждым оставшимся элементом левой половины.
+
+    Время O(n log n + |ядро|); при collect=False пары не создаются, только счётчик.
+    """
+    order = sorted(objects, key=lambda o: (posA[o], posB[o]))
+    keys = [posB[o] for o in order]
+    n = len(order)
+
+    count = 0
+    pairs: List[Tuple[int, int]] = []
+    items = list(range(n))
+    width = 1
+    while width < n:
+        merged: List[int] = []
+        for lo in range(0, n, 2 * width):
+            mid = min(lo + width, n)
+            hi = min(lo + 2 * width, n)
+            i, j = lo, mid
+            while i < mid and j < hi:
+                if keys[items[i]] <= keys[items[j]]:
+                    merged.append(items[i])
+                    i += 1
+                else:
+                    r = items[j]
+                    count += mid - i
+                    if collect:
+                        y = order[r]
+                        for k in range(i, mid):
+                            x = order[items[k]]
+                            pairs.append((x, y) if x < y else (y, x))
+                    merged.append(r)
+                    j += 1
+            merged.extend(items[i:mid])
+            merged.extend(items[j:hi])
+        items = merged
+        width *= 2
+
+    pairs.sort()
+    return count, pairs
+
+
+def _find_contradiction_core_sweep(
+    objects: List[int],
+    posA: Dict[int, int],
+    posB: Dict[int, int],
+) -> List[Tuple[int, int]]:
+    return _inversion_sweep(objects, posA, posB, collect=True)[1]
+
+
+def contradiction_count(json_a: str, json_b: str) -> int:
+    """Размер ядра противоречий |S(A,B)| без построения самих пар."""
+    ranking_a = _parse_ranking(json_a)
+    ranking_b = _parse_ranking(json_b)
+    objects = _collect_objects(ranking_a, ranking_b)
+    posA = _build_positions(ranking_a)
+    posB = _build_positions(ranking_b)
+    return _inversion_sweep(objects, posA, posB, collect=False)[0]
+
+
+class _DisjointSet:
+    """Система непересекающихся множеств (union by size + сжатие путей)."""
+
+    __slots__ = ('parent', 'size')
+
+    def __init__(self, n: int) -> None:
+        self.parent = list(range(n))
+        self.size = [1] * n
+
+    def find(self, x: int) -> int:
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a: int, b: int) -> None:
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return
+        if self.size[ra] < self.size[rb]:
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        self.size[ra] += self.size[rb]
+
+
 def _build_clusters(
     objects: List[int],
-    YAB: List[List[int]],
+    positions: List[Dict[int, int]],
     core_pairs: List[Tuple[int, int]],
 ) -> List[List[int]]:
     """
     Этап 2 (часть 1): поиск кластеров (компонент связности)
 
-    1) C = YAB — матрица согласованности (общих "не хуже")
-    2) E[i,j] = 1, если C[i,j] == 1 и C[j,i] == 1
-       (эквивалентность по отношению C)
-    3) добавляем рёбра между объектами из ядра противоречий
-    4) кластеры = компоненты связности графа по этим рёбрам
+    1) x_i и x_j эквивалентны по C = YAB, если C[i,j] == 1 и C[j,i] == 1,
+       т.е. они стоят в одном кластере и в A, и в B —
+       группируем объекты по ключу (posA, posB)
+       (для k ранжировок — по кортежу из k позиций)
+    2) объединяем объекты из ядра противоречий
+    3) кластеры = множества в системе непересекающихся множеств
+
+    Время почти линейное по n + |ядро|, матрицы n×n не нужны.
     """
     n = len(objects)
     index = {obj: i for i, obj in enumerate(objects)}
+    dsu = _DisjointSet(n)
 
-    C = YAB
-
-    # Матрица эквивалентности E по C
-    E = [[0] * n for _ in range(n)]
-    for i in range(n):
-        for j in range(n):
-            if C[i][j] and C[j][i]:
-                E[i][j] = 1
-
-
-    # Строю неориентированный граф: E + связи из ядра противоречий
-    adj = [[0] * n for _ in range(n)]
-
-    for i in range(n):
-        for j in range(n):
-            if i != j and E[i][j]:
-                adj[i][j] = adj[j][i] = 1
+    # эквивалентность по C: одинаковые позиции в обеих ранжировках
+    first_with_key: Dict[Tuple[int, ...], int] = {}
+    for i, obj in enumerate(objects):
+        key = tuple(pos[obj] for pos in positions)
+        j = first_with_key.setdefault(key, i)
+        if j != i:
+            dsu.union(i, j)
 
     for a, b in core_pairs:
-        ia, ib = index[a], index[b]
-        adj[ia][ib] = adj[ib][ia] = 1
+        dsu.union(index[a], index[b])
 
-    # Поиск компонент связности (DFS)
-    visited = [False] * n
-    components: List[List[int]] = []
-
-    for i in range(n):
-        if not visited[i]:
-            stack = [i]
-            visited[i] = True
-            comp = [i]
-            while stack:
-                v = stack.pop()
-                for u in range(n):
-                    if adj[v][u] and not visited[u]:
-                        visited[u] = True
-                        stack.append(u)
-                        comp.append(u)
-            comp.sort()
-            components.append(comp)
-
-    # Перевожу индексы в номера объектов
-    clusters: List[List[int]] = []
-    for comp in components:
-        cluster = [objects[i] for i in comp]
-        cluster.sort()
-        clusters.append(cluster)
-
-    return clusters
+    # objects отсортирован, поэтому кластеры сразу отсортированы
+    # и идут в порядке минимального объекта
+    groups: Dict[int, List[int]] = {}
+    for i, obj in enumerate(objects):
+        groups.setdefault(dsu.find(i), []).append(obj)
+    return list(groups.values())
 
 
 def _order_clusters(
     clusters: List[List[int]],
-    posA: Dict[int, int],
-    posB: Dict[int, int],
+    *positions: Dict[int, int],
 ) -> List[List[int]]:
     """
     Этап 2 (часть 2): упорядочиваем кластеры
 
-    Для каждого кластера считаем "среднюю позицию" по двум ранжировкам:
+    Для каждого кластера считаем "среднюю позицию" по всем ранжировкам
+    (для двух — posA и posB):
 
         score(C_k) = среднее значение (posA[x] + posB[x]) / 2 по x ∈ C_k
 
     Затем сортируем кластеры по score (от "хуже" к "лучше")
     Это даёт согласованную кластерную ранжировку.
     """
+    k = len(positions)
+
     def score(cluster: List[int]) -> float:
         s = 0.0
         for x in cluster:
-            s += (posA[x] + posB[x]) / 2.0
+            s += sum(pos[x] for pos in positions) / k
         return s / len(cluster)
 
     # сортирую по средней позиции и по минимуму объекта для устойчивости
@@ -239,7 +332,41 @@ def _format_ranking_for_json(clusters: List[List[int]]) -> List[RankingItem]:
     return result
 
 
-def main(json_a: str, json_b: str) -> str:
+ENGINES = ('sweep', 'python', 'numpy')
+
+
+def _position_vector(objects: List[int], positions: Dict[int, int]) -> "np.ndarray":
+    return np.fromiter((positions[o] for o in objects), dtype=np.int64, count=len(objects))
+
+
+def _find_contradiction_core_numpy(
+    objects: List[int],
+    posA: Dict[int, int],
+    posB: Dict[int, int],
+) -> List[Tuple[int, int]]:
+    """
+    Этап 1 на numpy, без промежуточных списков списков.
+
+    YA[i,j] = posA[i] >= posA[j] строится сравнением вектора позиций с самим
+    собой (pos[:, None] >= pos[None, :]), YAB = YA ∧ YB считается на месте.
+    M = YAB ∨ YAB^T симметрична, поэтому ядро — нули M выше диагонали.
+    """
+    pa = _position_vector(objects, posA)
+    pb = _position_vector(objects, posB)
+
+    YAB = pa[:, None] >= pa[None, :]
+    YAB &= pb[:, None] >= pb[None, :]
+
+    # ядро: пары, не сравнимые одинаково ни в одну сторону
+    core_mask = ~(YAB | YAB.T)
+    core_i, core_j = np.nonzero(np.triu(core_mask, 1))
+    core_pairs = [(objects[i], objects[j]) for i, j in zip(core_i.tolist(), core_j.tolist())]
+    core_pairs.sort()
+    return core_pairs
+
+
+def main(json_a: str, json_b: str, engine: str = 'sweep', profile: Optional[Profile] = None,
+         cache: Optional[ResultCache] = None) -> str:
     """
     Главная функция
 
@@ -248,42 +375,130 @@ def main(json_a: str, json_b: str) -> str:
         например:
             "[1,[2,3],4,[5,6,7],8,9,10]"
             "[[1,2],[3,4,5],6,7,9,[8,10]]"
+        engine — способ поиска ядра противоречий: 'sweep' (инверсии,
+                 без матриц), 'python' (списки) или 'numpy' (матрицы numpy)
+        profile — Profile для замеров по этапам (None — без замеров)
+        cache — ResultCache: повтор тех же ранжировок берёт готовый результат
 
     Возвращает:
         JSON-строку с результатом этапа 2:
         согласованную кластерную ранжировку, например:
         "[[1,3],[2,4],6,[5,7],8,9,10]"
     """
+    if cache is not None:
+        # результат от движка не зависит, поэтому в ключе только ранжировки
+        if engine not in ENGINES:
+            raise ValueError(f"Неизвестный движок: {engine!r}, ожидался один из {ENGINES}")
+        key = cache.key('task3', _normalize_json(json_a), _normalize_json(json_b))
+        hit, result = cache.get(key)
+        if not hit:
+            result = main(json_a, json_b, engine, profile)
+            cache.put(key, result)
+        return result
+
+    if profile is not None:
+        profile.start()
+
     # --- Парсим вход ---
     ranking_a = _parse_ranking(json_a)
     ranking_b = _parse_ranking(json_b)
 
     # --- Носитель (множество объектов) ---
     objects = _collect_objects(ranking_a, ranking_b)
+    if profile is not None:
+        profile.lap('parse', n=len(objects))
 
     # --- Позиции в каждой ранжировке ---
     posA = _build_positions(ranking_a)
     posB = _build_positions(ranking_b)
-
-    # --- Матрицы отношений YA и YB ---
-    YA = _build_relation_matrix(objects, posA)
-    YB = _build_relation_matrix(objects, posB)
-
-    # --- Этап 1: ядро противоречий + матрица согласованности YAB ---
-    core_pairs, YAB = _find_contradiction_core(objects, YA, YB)
+    if profile is not None:
+        profile.lap('positions')
+
+    if engine == 'sweep':
+        # --- Этап 1: ядро противоречий через инверсии ---
+        core_pairs = _find_contradiction_core_sweep(objects, posA, posB)
+    elif engine == 'numpy':
+        if np is None:
+            raise ImportError("Для engine='numpy' нужен numpy")
+        # --- Этап 1: ядро противоречий на numpy ---
+        core_pairs = _find_contradiction_core_numpy(objects, posA, posB)
+    elif engine == 'python':
+        # --- Матрицы отношений YA и YB ---
+        YA = _build_relation_matrix(objects, posA)
+        YB = _build_relation_matrix(objects, posB)
+
+        # --- Этап 1: ядро противоречий ---
+        core_pairs, _ = _find_contradiction_core(objects, YA, YB)
+    else:
+        raise ValueError(f"Неизвестный движок: {engine!r}, ожидался один из {ENGINES}")
+    if profile is not None:
+        profile.lap('core', core=len(core_pairs), engine=engine)
 
     # --- Этап 2: кластеры (компоненты связности) ---
-    clusters = _build_clusters(objects, YAB, core_pairs)
+    clusters = _build_clusters(objects, [posA, posB], core_pairs)
+    if profile is not None:
+        profile.lap('clusters', clusters=len(clusters))
 
     # --- Этап 2: упорядочивание кластеров ---
     ordered_clusters = _order_clusters(clusters, posA, posB)
+    if profile is not None:
+        profile.lap('order')
 
     # --- Формируем итоговую кластерную ранжировку для JSON ---
     final_ranking = _format_ranking_for_json(ordered_clusters)
 
     # Возвращаем только результат этапа 2
-    return json.dumps(final_ranking, ensure_ascii=False)
-
-
+    result = json.dumps(final_ranking, ensure_ascii=False)
+    if profile is not None:
+        profile.lap('format')
+    return result
 
 
+def main_many(json_rankings: List[str], profile: Optional[Profile] = None) -> str:
+    """
+    Согласование k экспертных ранжировок.
+
+    Позиции всех объектов строятся один раз. Пара (x, y) входит в общее ядро
+    противоречий, если хотя бы два эксперта упорядочили её строго
+    противоположно. Такие пары ищутся тем же проходом по инверсиям, что и в
+    main(), отдельно для каждой из k(k-1)/2 пар экспертов, поэтому поиск ядра
+    стоит O(k²·(n log n + |core|)), где |core| — ядро одной пары; матрицы n×n
+    не строятся. Кластеры — объекты, совпадающие по позициям у всех
+    экспертов, плюс связи ядра; порядок — по средней позиции у всех
+    экспертов. Для k = 2 результат совпадает с main().
+    profile — Profile для замеров по этапам (None — без замеров).
+    """
+    if not json_rankings:
+        raise ValueError("Нужна хотя бы одна ранжировка.")
+    if profile is not None:
+        profile.start()
+
+    rankings = [_parse_ranking(js) for js in json_rankings]
+    objects = _collect_objects(*rankings)
+    if profile is not None:
+        profile.lap('parse', n=len(objects), k=len(rankings))
+
+    positions = [_build_positions(r) for r in rankings]
+    if profile is not None:
+        profile.lap('positions')
+
+    core = set()
+    for a in range(len(positions)):
+        for b in range(a + 1, len(positions)):
+            core.update(_find_contradiction_core_sweep(objects, positions[a], positions[b]))
+    core_pairs = sorted(core)
+    if profile is not None:
+        profile.lap('core', core=len(core_pairs), pairs=len(positions) * (len(positions) - 1) // 2)
+
+    clusters = _build_clusters(objects, positions, core_pairs)
+    if profile is not None:
+        profile.lap('clusters', clusters=len(clusters))
+
+    ordered_clusters = _order_clusters(clusters, *positions)
+    if profile is not None:
+        profile.lap('order')
+
+    result = json.dumps(_format_ranking_for_json(ordered_clusters), ensure_ascii=False)
+    if profile is not None:
+        profile.lap('format')
+    return result
@@ -1,5 +1,30 @@
+import asyncio
+import hashlib
 import json
-from typing import Dict, List, Tuple, Any
+import os
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, deque
+from concurrent.futures import Executor
+from functools import lru_cache, partial
+from itertools import islice
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+try:
+    import numpy as np
+except ImportError:  # без numpy работает поэлементный вариант
+    np = None
+
+# общий код задач лежит в common/ в корне репозитория
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _ROOT not in sys.path:
+    sys.path.insert(0, _ROOT)
+
+from common.cache import ResultCache
+from common.profile import Profile
 
 
 def _norm_id(s: str) -> str:
@@ -9,7 +34,89 @@ def _norm_id(s: str) -> str:
     return s
 
 
-def _build_terms_map(var_json: str) -> Dict[str, List[Tuple[float, float]]]:
+def _normalize_json(json_str: str) -> str:
+    # без пробелов и переносов, порядок ключей сохраняется
+    return json.dumps(json.loads(json_str), ensure_ascii=False, separators=(',', ':'))
+
+
+class PiecewiseLinearMF:
+    """
+    Кусочно-линейная функция принадлежности.
+
+    Точки излома хранятся в параллельных массивах xs/ys (array('d')),
+    наклоны отрезков посчитаны заранее. Отрезок для x ищется бинарным
+    поиском, поэтому вычисление стоит O(log k) для терма из k точек.
+    Правила вычисления те же, что были у поиска перебором: левее первой
+    и правее последней точки — значение крайней точки, внутри — первый
+    отрезок, содержащий x, с отсечением в [0, 1].
+    """
+
+    __slots__ = ('xs', 'ys', 'slopes', '_np')
+
+    def __init__(self, points: Iterable[Sequence[float]]) -> None:
+        pts = [(float(x), float(y)) for x, y in points]
+        pts.sort(key=lambda p: p[0])
+        self.xs = array('d', (x for x, _ in pts))
+        self.ys = array('d', (y for _, y in pts))
+        # у вертикальных отрезков наклон не нужен: внутри них x не попадает
+        self.slopes = array('d', (
+            (y2 - y1) / (x2 - x1) if x2 != x1 else 0.0
+            for (x1, y1), (x2, y2) in zip(pts, pts[1:])
+        ))
+        self._np = None
+
+    def __len__(self) -> int:
+        return len(self.xs)
+
+    def __iter__(self) -> Iterator[Tuple[float, float]]:
+        return zip(self.xs, self.ys)
+
+    def segment(self, x: float) -> int:
+        # номер первого отрезка, правый конец которого не меньше x
+        # (для x строго между первой и последней точками)
+        return bisect_left(self.xs, x, 1) - 1
+
+    def __call__(self, x: float) -> float:
+        xs = self.xs
+        if not xs:
+            return 0.0
+        if x <= xs[0]:
+            return self.ys[0]
+        if x >= xs[-1]:
+            return self.ys[-1]
+        i = self.segment(x)
+        y = self.ys[i] + self.slopes[i] * (x - xs[i])
+        if y < 0:
+            y = 0.0
+        if y > 1:
+            y = 1.0
+        return y
+
+    def evaluate(self, x: Any) -> Any:
+        """Значения сразу для массива x (numpy.ndarray, без numpy — список)."""
+        if np is None:
+            return [self(float(v)) for v in x]
+        x = np.asarray(x, dtype=float)
+        if len(self.xs) == 0:
+            return np.zeros_like(x)
+        if len(self.xs) == 1:
+            return np.full_like(x, self.ys[0])
+        if self._np is None:
+            self._np = (np.frombuffer(self.xs, dtype=float),
+                        np.frombuffer(self.ys, dtype=float),
+                        np.frombuffer(self.slopes, dtype=float))
+        px, py, k = self._np
+
+        i = np.searchsorted(px[1:], x, side='left')
+        np.clip(i, 0, len(px) - 2, out=i)
+        y = py[i] + k[i] * (x - px[i])
+        np.clip(y, 0.0, 1.0, out=y)
+        y[x >= px[-1]] = py[-1]
+        y[x <= px[0]] = py[0]
+        return y
+
+
+def _build_terms_map(var_json: str) -> Dict[str, PiecewiseLinearMF]:
 
     data = json.loads(var_json)
     if not isinstance(data, dict) or len(data) == 0:
@@ -18,15 +125,26 @@ def _build_terms_map(var_json: str) -> Dict[str, List[Tuple[float, float]]]:
     first_key = next(iter(data.keys()))
     terms_list = data[first_key]
 
-    terms: Dict[str, List[Tuple[float, float]]] = {}
+    terms: Dict[str, PiecewiseLinearMF] = {}
     for obj in terms_list:
         term_id = _norm_id(obj["id"])
-        pts = [(float(x), float(y)) for x, y in obj["points"]]
-        pts.sort(key=lambda p: p[0])
-        terms[term_id] = pts
+        terms[term_id] = PiecewiseLinearMF(obj["points"])
     return terms
 
 
+def _build_variables_map(vars_json: str) -> Dict[str, Dict[str, PiecewiseLinearMF]]:
+    # все входные переменные: {"температура": [...], "скорость": [...], ...}
+    data = json.loads(vars_json)
+    if not isinstance(data, dict) or len(data) == 0:
+        raise ValueError("Некорректный json с переменными: ожидался объект-словарь")
+
+    variables: Dict[str, Dict[str, PiecewiseLinearMF]] = {}
+    for name, terms_list in data.items():
+        variables[_norm_id(name)] = {_norm_id(obj["id"]): PiecewiseLinearMF(obj["points"])
+                                     for obj in terms_list}
+    return variables
+
+
 def _match_term_id(terms_map: Dict[str, Any], raw_id: str) -> str:
 
     rid = _norm_id(raw_id)
@@ -40,84 +158,857 @@ def _match_term_id(terms_map: Dict[str, Any], raw_id: str) -> str:
     return rid
 
 
-def _mu_piecewise_linear(x: float, points: List[Tuple[float, float]]) -> float:
-    if not points:
-        return 0.0
+MembershipPoints = Union[PiecewiseLinearMF, Sequence[Sequence[float]]]
+
 
-    if x <= points[0][0]:
-        return float(points[0][1])
-    if x >= points[-1][0]:
-        return float(points[-1][1])
+def _as_mf(points: MembershipPoints) -> PiecewiseLinearMF:
+    if isinstance(points, PiecewiseLinearMF):
+        return points
+    return PiecewiseLinearMF(points)
 
-    for i in range(len(points) - 1):
-        x1, y1 = points[i]
-        x2, y2 = points[i + 1]
-        if x1 <= x <= x2:
-            if x2 == x1:
-                #на случай одинаковых x
-                return float(max(y1, y2))
-            k = (y2 - y1) / (x2 - x1)
-            y = y1 + k * (x - x1)
-            if y < 0:
-                y = 0.0
-            if y > 1:
-                y = 1.0
-            return float(y)
-    return 0.0
 
+def _mu_piecewise_linear(x: float, points: MembershipPoints) -> float:
+    return float(_as_mf(points)(x))
 
-def main(temp_mf_json: str, control_mf_json: str, rules_json: str, t: float) -> float:
 
-    temp_terms = _build_terms_map(temp_mf_json)
-    control_terms = _build_terms_map(control_mf_json)
+def _mu_piecewise_linear_np(x: "np.ndarray", points: MembershipPoints) -> "np.ndarray":
+    # то же, что _mu_piecewise_linear, но сразу для массива x
+    return _as_mf(points).evaluate(x)
 
-    rules = json.loads(rules_json)
-    if not isinstance(rules, list):
-        raise ValueError("Некорректный json с правилами: ожидался список")
 
-    mu_temp: Dict[str, float] = {}
-    for term_id, pts in temp_terms.items():
-        mu_temp[term_id] = _mu_piecewise_linear(float(t), pts)
+def _resolve_engine(engine: str) -> str:
+    if engine == 'auto':
+        engine = 'numpy' if np is not None else 'python'
+    if engine not in ('python', 'numpy'):
+        raise ValueError(f"Неизвестный движок: {engine!r}, ожидался 'auto', 'python' или 'numpy'")
+    if engine == 'numpy' and np is None:
+        raise ImportError("Для engine='numpy' нужен numpy")
+    return engine
 
+
+def _output_grid(control_terms: Dict[str, PiecewiseLinearMF], step: float) -> Tuple[List[float], float, float]:
+    # сетка по выходной переменной: от крайней левой до крайней правой точки термов
     all_s = [x for pts in control_terms.values() for (x, _) in pts]
     if not all_s:
-        return 0.0
+        return [], 0.0, 0.0
     s_min = float(min(all_s))
     s_max = float(max(all_s))
-
-    step = 0.01
     n_steps = int(round((s_max - s_min) / step)) + 1
-    s_grid = [s_min + i * step for i in range(n_steps)]
-
-
-    agg_mu = [0.0 for _ in s_grid]
-
-    for rule in rules:
-        if not (isinstance(rule, list) or isinstance(rule, tuple)) or len(rule) != 2:
-            continue
-
-        raw_temp_term, raw_control_term = rule[0], rule[1]
-        temp_term = _match_term_id(temp_terms, str(raw_temp_term))
-        control_term = _match_term_id(control_terms, str(raw_control_term))
-
-        alpha = mu_temp.get(temp_term, 0.0)
-        if alpha <= 0.0:
-            continue
-        if control_term not in control_terms:
-            continue
-
-        control_pts = control_terms[control_term]
-        for i, s in enumerate(s_grid):
-            mu_out = _mu_piecewise_linear(s, control_pts)
-            clipped = min(alpha, mu_out)
-            if clipped > agg_mu[i]:
-                agg_mu[i] = clipped
-
-    max_mu = max(agg_mu) if agg_mu else 0.0
-    for s, mu in zip(s_grid, agg_mu):
-        if mu == max_mu:
-            return float(s)
-
-    return float(s_min)
-
-
+    return [s_min + i * step for i in range(n_steps)], s_min, s_max
+
+
+def _grid_memberships(control_terms: Dict[str, PiecewiseLinearMF], used_terms: Iterable[str],
+                      s_grid: List[float], engine: str) -> Dict[str, Any]:
+    # принадлежность выходных термов на сетке считается один раз
+    # (списки или массивы numpy, в зависимости от движка)
+    control_mu: Dict[str, Any] = {}
+    s_array = np.array(s_grid) if engine == 'numpy' else None
+    for control_term in used_terms:
+        if control_term not in control_mu:
+            pts = control_terms[control_term]
+            if engine == 'numpy':
+                control_mu[control_term] = _mu_piecewise_linear_np(s_array, pts)
+            else:
+                control_mu[control_term] = [_mu_piecewise_linear(s, pts) for s in s_grid]
+    return control_mu
+
+
+def _first_max_on_grid(alphas: Dict[str, float], s_grid: List[float],
+                       control_mu: Dict[str, Any], engine: str) -> float:
+    if engine == 'numpy':
+        # отсечение и агрегация максимумом — операции над массивами,
+        # argmax возвращает первый максимум
+        agg = np.zeros(len(s_grid))
+        for control_term, alpha in alphas.items():
+            np.maximum(agg, np.minimum(control_mu[control_term], alpha), out=agg)
+        return float(s_grid[int(np.argmax(agg))])
+
+    agg_mu = [0.0] * len(s_grid)
+    for control_term, alpha in alphas.items():
+        agg_mu = list(map(max, agg_mu, [min(alpha, mu) for mu in control_mu[control_term]]))
+
+    # первый максимум
+    return float(s_grid[agg_mu.index(max(agg_mu))])
+
+
+class FuzzyController:
+    """
+    Нечёткий регулятор, собранный один раз из json-описаний.
+
+    При создании разбираются термы и правила, идентификаторы термов в
+    правилах сразу приводятся к ключам словарей, строится сетка по выходу
+    и функции принадлежности выходных термов на этой сетке.
+    infer(t) после этого только считает степени входа и агрегирует.
+    """
+
+    def __init__(self, temp_mf_json: str, control_mf_json: str, rules_json: str,
+                 step: float = 0.01, engine: str = 'auto') -> None:
+        self.engine = engine = _resolve_engine(engine)
+
+        self.temp_terms = _build_terms_map(temp_mf_json)
+        self.control_terms = _build_terms_map(control_mf_json)
+
+        rules = json.loads(rules_json)
+        if not isinstance(rules, list):
+            raise ValueError("Некорректный json с правилами: ожидался список")
+
+        # правила с уже найденными термами; заведомо не срабатывающие отброшены
+        self.rules: List[Tuple[str, str]] = []
+        for rule in rules:
+            if not (isinstance(rule, list) or isinstance(rule, tuple)) or len(rule) != 2:
+                continue
+            temp_term = _match_term_id(self.temp_terms, str(rule[0]))
+            control_term = _match_term_id(self.control_terms, str(rule[1]))
+            if temp_term in self.temp_terms and control_term in self.control_terms:
+                self.rules.append((temp_term, control_term))
+        # входные термы, встречающиеся в правилах: степени считаются только для них
+        self._used: List[str] = list(dict.fromkeys(temp_term for temp_term, _ in self.rules))
+
+        self.s_grid, self.s_min, self.s_max = _output_grid(self.control_terms, step)
+        self.control_mu = _grid_memberships(
+            self.control_terms, (control_term for _, control_term in self.rules), self.s_grid, engine)
+
+    def _memberships(self, t: float) -> Dict[str, float]:
+        temp_terms = self.temp_terms
+        return {term: _mu_piecewise_linear(t, temp_terms[term]) for term in self._used}
+
+    def _alphas(self, mu: Dict[str, float]) -> Dict[str, float]:
+        # степень срабатывания по каждому выходному терму:
+        # min(a1, mu) и min(a2, mu) в максимуме дают min(max(a1, a2), mu)
+        alphas: Dict[str, float] = {}
+        for temp_term, control_term in self.rules:
+            alpha = mu[temp_term]
+            if alpha > alphas.get(control_term, 0.0):
+                alphas[control_term] = alpha
+        return alphas
+
+    def _firing(self, t: float) -> Dict[str, float]:
+        return self._alphas(self._memberships(t))
+
+    def _fired_rules(self, mu: Dict[str, float]) -> int:
+        # число правил с ненулевой степенью срабатывания (только для профиля)
+        return sum(1 for temp_term, _ in self.rules if mu[temp_term] > 0.0)
+
+    def infer(self, t: float, profile: Optional[Profile] = None) -> float:
+        t = float(t)
+        if not self.s_grid:
+            return 0.0
+
+        if profile is None:
+            alphas = self._firing(t)
+        else:
+            profile.start()
+            mu = self._memberships(t)
+            alphas = self._alphas(mu)
+            profile.lap('firing', rules=len(self.rules), fired_rules=self._fired_rules(mu),
+                        fired_terms=len(alphas))
+        result = _first_max_on_grid(alphas, self.s_grid, self.control_mu, self.engine)
+        if profile is not None:
+            profile.lap('aggregate', grid=len(self.s_grid))
+        return result
+
+    def _infer_block(self, ts: "np.ndarray", max_cells: int = 1 << 20) -> "np.ndarray":
+        """
+        Вывод сразу для массива входов.
+
+        Сначала строится матрица степеней срабатывания (входы × выходные термы).
+        Одинаковые строки (вход попал на плато всех термов) считаются один раз,
+        для остальных агрегация идёт матрицей (строки × сетка) блоками
+        не больше max_cells элементов; по строке берётся первый максимум.
+        """
+        terms = list(dict.fromkeys(control_term for _, control_term in self.rules))
+        alphas = np.zeros((len(ts), len(terms)))
+        mu_temp: Dict[str, "np.ndarray"] = {}
+        for temp_term, control_term in self.rules:
+            mu = mu_temp.get(temp_term)
+            if mu is None:
+                mu = mu_temp[temp_term] = _mu_piecewise_linear_np(ts, self.temp_terms[temp_term])
+            col = alphas[:, terms.index(control_term)]
+            np.maximum(col, mu, out=col)
+
+        unique, inverse = np.unique(alphas, axis=0, return_inverse=True)
+        grid = np.asarray(self.s_grid)
+        result = np.empty(len(unique))
+        rows = self._chunk_size(max_cells)
+        for lo in range(0, len(unique), rows):
+            block = unique[lo:lo + rows]
+            agg = np.zeros((len(block), len(grid)))
+            clipped = np.empty_like(agg)
+            for c, control_term in enumerate(terms):
+                np.minimum(self.control_mu[control_term][None, :], block[:, c:c + 1], out=clipped)
+                np.maximum(agg, clipped, out=agg)
+            result[lo:lo + rows] = grid[np.argmax(agg, axis=1)]
+        return result[inverse.reshape(-1)]
+
+    def _chunk_size(self, max_cells: int) -> int:
+        return max(1, max_cells // max(1, len(self.s_grid)))
+
+    def iter_infer(self, ts: Iterable[float], chunk_size: int = 1) -> Iterator[float]:
+        """
+        Потоковый вывод: выдаёт результат для каждого входа по мере чтения ts.
+
+        chunk_size > 1 — входы накапливаются пачками такого размера
+        и считаются одной матричной операцией (только для engine='numpy').
+        """
+        it = iter(ts)
+        if chunk_size <= 1 or self.engine != 'numpy' or not self.s_grid:
+            for t in it:
+                yield self.infer(t)
+            return
+        while True:
+            chunk = list(islice(it, chunk_size))
+            if not chunk:
+                return
+            yield from self._infer_block(np.array(chunk, dtype=float)).tolist()
+
+    def infer_many(self, ts: Iterable[float], max_cells: int = 1 << 20) -> List[float]:
+        """
+        Вывод для последовательности входов (список, массив, генератор).
+
+        С numpy все входы считаются одной матричной операцией, промежуточные
+        матрицы (входы × сетка) ограничены max_cells элементами.
+        """
+        if self.engine != 'numpy' or not self.s_grid:
+            return [self.infer(t) for t in ts]
+        ts = np.fromiter((float(t) for t in ts), dtype=float)
+        return self._infer_block(ts, max_cells).tolist()
+
+    def build_table(self, tol: float = 0.01, **kwargs: Any) -> 'ControlTable':
+        """Таблица вход -> выход с интерполяцией (см. ControlTable.build)."""
+        return ControlTable.build(self, tol, **kwargs)
+
+    def defuzzify(self, t: float, method: str = 'first_max') -> float:
+        """
+        Точная дефаззификация без сетки.
+
+        Агрегированная функция кусочно-линейна, поэтому считается по её
+        точкам излома за время, пропорциональное числу отрезков:
+            'first_max' — самая левая точка максимума (точная нижняя грань
+                          множества, где достигается максимум);
+            'centroid'  — центр тяжести, интегралы по кускам в замкнутом виде;
+            'mom'       — середина максимумов (центр тяжести плато максимума,
+                          а если плато нет — среднее точек максимума).
+        В отличие от infer(), результат не округляется до шага сетки.
+        """
+        if method not in DEFUZZ_METHODS:
+            raise ValueError(f"Неизвестный способ дефаззификации: {method!r}, ожидался один из {DEFUZZ_METHODS}")
+        t = float(t)
+        if not self.s_grid:
+            return 0.0
+        terms = [(self.control_terms[c], alpha) for c, alpha in self._firing(t).items()]
+        pieces = _aggregate_pieces(terms, self.s_min, self.s_max)
+        if not pieces:
+            return self.s_min
+
+        if method == 'centroid':
+            area = 0.0
+            moment = 0.0
+            for a, b, fa, fb in pieces:
+                area += (fa + fb) / 2 * (b - a)
+                moment += (b - a) / 6 * (fa * (2 * a + b) + fb * (a + 2 * b))
+            return moment / area if area > 0 else self.s_min
+
+        # значения в самих точках разбиения: в точке вертикального скачка
+        # функция может быть выше обоих односторонних пределов
+        def point_mu(x: float) -> float:
+            return max([0.0] + [min(alpha, mf(x)) for mf, alpha in terms])
+
+        at = [point_mu(a) for a, _, _, _ in pieces] + [point_mu(pieces[-1][1])]
+        max_mu = max(max(max(fa, fb) for _, _, fa, fb in pieces), max(at))
+        if method == 'first_max':
+            for (a, b, fa, fb), fx in zip(pieces, at):
+                if fx == max_mu or fa == max_mu:
+                    return a
+                if fb == max_mu:
+                    return b
+            return pieces[-1][1]
+
+        length = 0.0
+        moment = 0.0
+        points = [x for x, fx in zip([a for a, _, _, _ in pieces] + [pieces[-1][1]], at) if fx == max_mu]
+        for a, b, fa, fb in pieces:
+            if fa == max_mu and fb == max_mu:
+                length += b - a
+                moment += (a + b) / 2 * (b - a)
+            if fa == max_mu:
+                points.append(a)
+            if fb == max_mu:
+                points.append(b)
+        if length > 0:
+            return moment / length
+        points = list(dict.fromkeys(points))
+        return sum(points) / len(points)
+
+
+def _clipped_line(mf: PiecewiseLinearMF, alpha: float, a: float, b: float) -> Tuple[float, float]:
+    """
+    Значения min(alpha, mu(x)) на концах интервала [a, b], внутри которого
+    mu линейна (нет вершин и пересечений с 0, 1 и alpha).
+
+    Отрезок выбирается по середине интервала, поэтому на концах получаются
+    односторонние пределы — это важно в точках вертикальных скачков.
+    """
+    m = (a + b) / 2
+    xs, ys = mf.xs, mf.ys
+    if m <= xs[0]:
+        ya = yb = ys[0]
+    elif m >= xs[-1]:
+        ya = yb = ys[-1]
+    else:
+        i = mf.segment(m)
+        x1, y1, k = xs[i], ys[i], mf.slopes[i]
+        ya = min(max(y1 + k * (a - x1), 0.0), 1.0)
+        yb = min(max(y1 + k * (b - x1), 0.0), 1.0)
+        # внутри интервала линия не пересекает alpha: если середина не ниже,
+        # отсечён весь интервал. Конец в точке пересечения по формуле даёт
+        # alpha с ошибкой округления (0.2999... вместо 0.3), а поиск
+        # максимума сравнивает значения на равенство — ставим alpha точно
+        if (ya + yb) / 2 >= alpha:
+            return alpha, alpha
+    return min(alpha, ya), min(alpha, yb)
+
+
+def _aggregate_pieces(
+    terms: List[Tuple[PiecewiseLinearMF, float]],
+    lo: float,
+    hi: float,
+) -> List[Tuple[float, float, float, float]]:
+    """
+    Агрегированная функция max(0, max_c min(alpha_c, mu_c(x))) на [lo, hi]
+    в виде линейных кусков (a, b, f(a+), f(b-)).
+
+    Точки разбиения: вершины термов, пересечения отрезков с уровнями 0, 1
+    и alpha (там меняется отсечение), затем внутри каждого интервала —
+    пересечения термов между собой и с нулём (там меняется максимум).
+    """
+    cuts = {lo, hi}
+    for mf, alpha in terms:
+        xs, ys = mf.xs, mf.ys
+        for x in xs:
+            if lo < x < hi:
+                cuts.add(x)
+        for i, k in enumerate(mf.slopes):
+            x1, y1, x2 = xs[i], ys[i], xs[i + 1]
+            if x2 == x1 or k == 0:
+                continue
+            for level in (0.0, 1.0, alpha):
+                x = x1 + (level - y1) / k
+                if x1 < x < x2 and lo < x < hi:
+                    cuts.add(x)
+    cuts_sorted = sorted(cuts)
+
+    pieces: List[Tuple[float, float, float, float]] = []
+    for a, b in zip(cuts_sorted, cuts_sorted[1:]):
+        lines = [(0.0, 0.0)] + [_clipped_line(mf, alpha, a, b) for mf, alpha in terms]
+        inner = set()
+        for p in range(len(lines)):
+            for q in range(p + 1, len(lines)):
+                da = lines[p][0] - lines[q][0]
+                db = lines[p][1] - lines[q][1]
+                if da * db < 0:
+                    inner.add(a + (b - a) * da / (da - db))
+        xs = [a] + sorted(x for x in inner if a < x < b) + [b]
+
+        for x1, x2 in zip(xs, xs[1:]):
+            # значения на концах берём по линии, максимальной в середине куска
+            xm = (x1 + x2) / 2
+            tm = (xm - a) / (b - a)
+            ya, yb = max(lines, key=lambda ln: ln[0] + (ln[1] - ln[0]) * tm)
+            pieces.append((x1, x2, _line_at(ya, yb, a, b, x1), _line_at(ya, yb, a, b, x2)))
+    return pieces
+
+
+def _line_at(ya: float, yb: float, a: float, b: float, x: float) -> float:
+    # на концах — сами ya и yb: ya + (yb - ya) может отличаться от yb
+    # в последнем разряде, а максимум ищется сравнением на равенство
+    if x == a:
+        return ya
+    if x == b:
+        return yb
+    y = ya + (yb - ya) * (x - a) / (b - a)
+    return min(max(y, min(ya, yb)), max(ya, yb))
+
+
+DEFUZZ_METHODS = ('first_max', 'centroid', 'mom')
+
+
+class MultiInputController:
+    """
+    Нечёткий регулятор с несколькими входными переменными.
+
+    Правило — либо прежняя пара [терм, управление] (терм первой переменной),
+    либо объект {"if": {переменная: терм, ...}, "op": "and" | "or",
+    "then": управление}; "if" можно задать и списком пар. И — минимум
+    степеней посылок, ИЛИ — максимум.
+
+    Правила индексируются по посылке (переменная, терм), поэтому infer
+    просматривает только правила, у которых есть посылка с ненулевой
+    степенью. ИЛИ-правило в агрегации максимумом распадается на независимые
+    посылки и хранится под каждой из них; И-правило хранится под первой
+    посылкой, остальные проверяются только если она ненулевая.
+    """
+
+    def __init__(self, inputs_mf_json: str, control_mf_json: str, rules_json: str,
+                 step: float = 0.01, engine: str = 'auto') -> None:
+        self.engine = engine = _resolve_engine(engine)
+
+        self.inputs = _build_variables_map(inputs_mf_json)
+        self.control_terms = _build_terms_map(control_mf_json)
+        self._first_var = next(iter(self.inputs))
+
+        rules = json.loads(rules_json)
+        if not isinstance(rules, list):
+            raise ValueError("Некорректный json с правилами: ожидался список")
+
+        # (переменная, терм) -> выходные термы одиночных и ИЛИ-посылок
+        self._single: Dict[Tuple[str, str], List[str]] = {}
+        # (переменная, терм) -> (остальные посылки, выходной терм) для И-правил
+        self._conj: Dict[Tuple[str, str], List[Tuple[Tuple[Tuple[str, str], ...], str]]] = {}
+        used_controls: List[str] = []
+        # посылки и связка каждого правила — для подсчёта сработавших в профиле
+        self._rules: List[Tuple[List[Tuple[str, str]], str]] = []
+        self.n_rules = 0
+        for rule in rules:
+            parsed = self._parse_rule(rule)
+            if parsed is None:
+                continue
+            antecedents, op, control_term = parsed
+            if op == 'or' or len(antecedents) == 1:
+                for key in antecedents:
+                    targets = self._single.setdefault(key, [])
+                    if control_term not in targets:
+                        targets.append(control_term)
+            else:
+                self._conj.setdefault(antecedents[0], []).append((tuple(antecedents[1:]), control_term))
+            used_controls.append(control_term)
+            self._rules.append((antecedents, op))
+            self.n_rules += 1
+
+        # степени считаются только для термов, встречающихся в правилах
+        self._used: Dict[str, List[str]] = {}
+        for var, term in list(self._single) + list(self._conj):
+            terms = self._used.setdefault(var, [])
+            if term not in terms:
+                terms.append(term)
+        for rest in self._conj.values():
+            for antecedents, _ in rest:
+                for var, term in antecedents:
+                    terms = self._used.setdefault(var, [])
+                    if term not in terms:
+                        terms.append(term)
+
+        self.s_grid, self.s_min, self.s_max = _output_grid(self.control_terms, step)
+        self.control_mu = _grid_memberships(self.control_terms, used_controls, self.s_grid, engine)
+
+    def _antecedent(self, var: str, term: str) -> Tuple[str, str]:
+        var = _match_term_id(self.inputs, var)
+        if var not in self.inputs:
+            return var, ''
+        return var, _match_term_id(self.inputs[var], term)
+
+    def _parse_rule(self, rule: Any) -> Union[Tuple[List[Tuple[str, str]], str, str], None]:
+        if isinstance(rule, (list, tuple)):
+            if len(rule) != 2:
+                return None
+            pairs: Iterable[Sequence[Any]] = [(self._first_var, rule[0])]
+            op, then = 'and', rule[1]
+        elif isinstance(rule, dict) and "if" in rule and "then" in rule:
+            cond = rule["if"]
+            pairs = cond.items() if isinstance(cond, dict) else cond
+            op = str(rule.get("op", "and")).strip().lower()
+            if op not in ('and', 'or'):
+                raise ValueError(f"Неизвестная связка: {op!r}, ожидалась 'and' или 'or'")
+            then = rule["then"]
+        else:
+            return None
+
+        control_term = _match_term_id(self.control_terms, str(then))
+        if control_term not in self.control_terms:
+            return None
+
+        antecedents: List[Tuple[str, str]] = []
+        for pair in pairs:
+            var, term = self._antecedent(str(pair[0]), str(pair[1]))
+            if var in self.inputs and term in self.inputs[var]:
+                if (var, term) not in antecedents:
+                    antecedents.append((var, term))
+            elif op == 'and':
+                # неизвестная посылка в И-правиле: правило не сработает никогда
+                return None
+        if not antecedents:
+            return None
+        return antecedents, op, control_term
+
+    def _memberships(self, inputs: Dict[str, float]) -> Dict[Tuple[str, str], float]:
+        values = {_match_term_id(self.inputs, str(k)): float(v) for k, v in inputs.items()}
+        mu: Dict[Tuple[str, str], float] = {}
+        for var, terms in self._used.items():
+            if var not in values:
+                raise ValueError(f"Не задано значение входной переменной {var!r}")
+            x = values[var]
+            var_terms = self.inputs[var]
+            for term in terms:
+                mu[(var, term)] = var_terms[term](x)
+        return mu
+
+    def _firing(self, inputs: Dict[str, float]) -> Dict[str, float]:
+        return self._alphas(self._memberships(inputs))
+
+    def _alphas(self, mu: Dict[Tuple[str, str], float]) -> Dict[str, float]:
+        alphas: Dict[str, float] = {}
+        for key, alpha in mu.items():
+            if alpha <= 0.0:
+                continue
+            for control_term in self._single.get(key, ()):
+                if alpha > alphas.get(control_term, 0.0):
+                    alphas[control_term] = alpha
+            for rest, control_term in self._conj.get(key, ()):
+                a = alpha
+                for other in rest:
+                    m = mu[other]
+                    if m < a:
+                        a = m
+                        if a <= 0.0:
+                            break
+                if a > alphas.get(control_term, 0.0):
+                    alphas[control_term] = a
+        return alphas
+
+    def _fired_rules(self, mu: Dict[Tuple[str, str], float]) -> int:
+        # И-правило срабатывает, если ненулевы все посылки, ИЛИ-правило — хотя бы одна
+        fired = 0
+        for antecedents, op in self._rules:
+            check = any if op == 'or' else all
+            if check(mu[key] > 0.0 for key in antecedents):
+                fired += 1
+        return fired
+
+    def infer(self, inputs: Dict[str, float], profile: Optional[Profile] = None) -> float:
+        if not self.s_grid:
+            return 0.0
+        if profile is None:
+            alphas = self._firing(inputs)
+        else:
+            profile.start()
+            mu = self._memberships(inputs)
+            alphas = self._alphas(mu)
+            profile.lap('firing', rules=self.n_rules, fired_rules=self._fired_rules(mu),
+                        fired_terms=len(alphas))
+        result = _first_max_on_grid(alphas, self.s_grid, self.control_mu, self.engine)
+        if profile is not None:
+            profile.lap('aggregate', grid=len(self.s_grid))
+        return result
+
+
+class ControlTable:
+    """
+    Таблица вход -> выход для фиксированной конфигурации регулятора.
+
+    Узлы: точки излома входных термов, между ними — адаптивное деление
+    пополам, пока линейная интерполяция расходится с точным выводом
+    больше чем на tol (проверяются середина и четверти интервала).
+    Запрос — бинарный поиск и интерполяция, O(log m). Вне диапазона узлов
+    выход постоянен (входные термы там постоянны). Около скачков выхода
+    точность ограничена min_width — ширина интервала, меньше которой
+    деление прекращается.
+    """
+
+    __slots__ = ('xs', 'ys', 'tol')
+
+    _MAGIC = b'FZLT'
+    _HEADER = struct.Struct('<4sIId')
+    _VERSION = 1
+
+    def __init__(self, xs: Iterable[float], ys: Iterable[float], tol: float) -> None:
+        self.xs = array('d', xs)
+        self.ys = array('d', ys)
+        self.tol = float(tol)
+
+    def __len__(self) -> int:
+        return len(self.xs)
+
+    @classmethod
+    def build(cls, controller: 'FuzzyController', tol: float = 0.01,
+              min_width: float = 1e-4, max_points: int = 1 << 20) -> 'ControlTable':
+        knots = sorted({float(x) for pts in controller.temp_terms.values() for x, _ in pts})
+        if not knots:
+            knots = [0.0]
+        f = controller.infer
+        xs = [knots[0]]
+        ys = [f(knots[0])]
+        for b in knots[1:]:
+            stack = [(xs[-1], ys[-1], b, f(b))]
+            while stack:
+                a, ya, b, yb = stack.pop()
+                if b - a > min_width and len(xs) < max_points:
+                    m = (a + b) / 2
+                    ym = f(m)
+                    q1 = (a + m) / 2
+                    q3 = (m + b) / 2
+                    err = max(abs((ya + yb) / 2 - ym),
+                              abs((3 * ya + yb) / 4 - f(q1)),
+                              abs((ya + 3 * yb) / 4 - f(q3)))
+                    if err > tol:
+                        # сначала обрабатывается левая половина — узлы идут по порядку
+                        stack.append((m, ym, b, yb))
+                        stack.append((a, ya, m, ym))
+                        continue
+                xs.append(b)
+                ys.append(yb)
+        return cls(xs, ys, tol)
+
+    def __call__(self, t: float) -> float:
+        xs, ys = self.xs, self.ys
+        t = float(t)
+        i = bisect_right(xs, t)
+        if i == 0:
+            return ys[0]
+        if i == len(xs):
+            return ys[-1]
+        x1, x2 = xs[i - 1], xs[i]
+        y1 = ys[i - 1]
+        return y1 + (ys[i] - y1) * (t - x1) / (x2 - x1)
+
+    def validate(self, controller: 'FuzzyController', samples: int = 10000) -> float:
+        """Наибольшее отклонение от точного вывода на равномерной сетке входов."""
+        lo, hi = self.xs[0], self.xs[-1]
+        if samples < 2 or hi == lo:
+            ts = [lo]
+        else:
+            ts = [lo + (hi - lo) * i / (samples - 1) for i in range(samples)]
+        exact = controller.infer_many(ts)
+        return max(abs(self(t) - y) for t, y in zip(ts, exact))
+
+    def save(self, path: str) -> None:
+        xs, ys = self.xs, self.ys
+        if sys.byteorder != 'little':
+            xs, ys = array('d', xs), array('d', ys)
+            xs.byteswap()
+            ys.byteswap()
+        with open(path, 'wb') as f:
+            f.write(self._HEADER.pack(self._MAGIC, self._VERSION, len(xs), self.tol))
+            xs.tofile(f)
+            ys.tofile(f)
+
+    @classmethod
+    def load(cls, path: str) -> 'ControlTable':
+        with open(path, 'rb') as f:
+            magic, version, count, tol = cls._HEADER.unpack(f.read(cls._HEADER.size))
+            if magic != cls._MAGIC or version != cls._VERSION:
+                raise ValueError(f"Файл {path!r} не является таблицей регулятора")
+            table = cls((), (), tol)
+            table.xs.fromfile(f, count)
+            table.ys.fromfile(f, count)
+        if sys.byteorder != 'little':
+            table.xs.byteswap()
+            table.ys.byteswap()
+        return table
+
+
+@lru_cache(maxsize=32)
+def compile_controller(temp_mf_json: str, control_mf_json: str, rules_json: str) -> FuzzyController:
+    # одна и та же конфигурация компилируется один раз
+    return FuzzyController(temp_mf_json, control_mf_json, rules_json)
+
+
+@lru_cache(maxsize=32)
+def compile_multi_controller(inputs_mf_json: str, control_mf_json: str, rules_json: str) -> MultiInputController:
+    return MultiInputController(inputs_mf_json, control_mf_json, rules_json)
+
+
+class FuzzyControlService:
+    """
+    Асинхронная обёртка регулятора для сервиса.
+
+    Скомпилированные регуляторы хранятся по sha256 от json конфигурации
+    (не больше max_controllers, вытесняются давно не использованные).
+    Запросы с одной конфигурацией, пришедшие в течение window секунд,
+    объединяются в одну пачку и считаются одним вызовом infer_many();
+    пачка уходит раньше, если набралось max_batch запросов.
+    Компиляция и infer_many() выполняются в executor (None — пул потоков
+    цикла событий по умолчанию), сам цикл событий ими не занят.
+    metrics() — задержки запросов, глубина очереди, размеры пачек.
+    """
+
+    def __init__(self, window: float = 0.001, max_batch: int = 4096,
+                 max_controllers: int = 32, executor: Optional[Executor] = None) -> None:
+        self.window = window
+        self.max_batch = max_batch
+        self.max_controllers = max_controllers
+        self.executor = executor
+        # значение — future компиляции: одновременные запросы с новой
+        # конфигурацией ждут одну и ту же компиляцию
+        self._controllers: 'OrderedDict[str, asyncio.Future]' = OrderedDict()
+        self._pending: Dict[str, List[Tuple[float, asyncio.Future]]] = {}
+        self._latencies: Deque[float] = deque(maxlen=10000)
+        self.requests = 0
+        self.batches = 0
+        self.compiles = 0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+
+    @staticmethod
+    def config_key(temp_mf_json: str, control_mf_json: str, rules_json: str) -> str:
+        h = hashlib.sha256()
+        for part in (temp_mf_json, control_mf_json, rules_json):
+            h.update(part.encode('utf-8'))
+            h.update(b'\0')
+        return h.hexdigest()
+
+    async def _controller(self, key: str, temp_mf_json: str, control_mf_json: str,
+                          rules_json: str) -> FuzzyController:
+        compiling = self._controllers.get(key)
+        if compiling is not None:
+            self._controllers.move_to_end(key)
+        else:
+            loop = asyncio.get_running_loop()
+            compiling = loop.run_in_executor(self.executor, FuzzyController,
+                                             temp_mf_json, control_mf_json, rules_json)
+            self.compiles += 1
+            self._controllers[key] = compiling
+            if len(self._controllers) > self.max_controllers:
+                self._controllers.popitem(last=False)
+        try:
+            # shield: отмена одного запроса не отменяет общую компиляцию
+            return await asyncio.shield(compiling)
+        except Exception:
+            # ошибочная конфигурация в кэше не остаётся
+            if self._controllers.get(key) is compiling:
+                del self._controllers[key]
+            raise
+
+    def _flush(self, key: str, batch: List[Tuple[float, asyncio.Future]],
+               controller: FuzzyController) -> None:
+        if self._pending.get(key) is not batch:
+            return  # пачка уже отправлена по max_batch
+        del self._pending[key]
+        self.queue_depth -= len(batch)
+        self.batches += 1
+        job = asyncio.get_running_loop().run_in_executor(
+            self.executor, controller.infer_many, [t for t, _ in batch])
+        job.add_done_callback(partial(self._resolve, batch))
+
+    @staticmethod
+    def _resolve(batch: List[Tuple[float, asyncio.Future]], job: asyncio.Future) -> None:
+        # результаты пачки из executor раздаются ожидающим запросам
+        if job.cancelled():
+            for _, fut in batch:
+                fut.cancel()
+            return
+        exc = job.exception()
+        if exc is not None:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(exc)
+            return
+        for (_, fut), value in zip(batch, job.result()):
+            if not fut.done():
+                fut.set_result(value)
+
+    async def infer(self, temp_mf_json: str, control_mf_json: str, rules_json: str,
+                    t: float) -> float:
+        start = time.perf_counter()
+        try:
+            key = self.config_key(temp_mf_json, control_mf_json, rules_json)
+            controller = await self._controller(key, temp_mf_json, control_mf_json, rules_json)
+            loop = asyncio.get_running_loop()
+            fut = loop.create_future()
+
+            batch = self._pending.get(key)
+            if batch is None:
+                batch = self._pending[key] = []
+                loop.call_later(self.window, self._flush, key, batch, controller)
+            batch.append((float(t), fut))
+            self.queue_depth += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+            if len(batch) >= self.max_batch:
+                self._flush(key, batch, controller)
+            return await fut
+        finally:
+            self.requests += 1
+            self._latencies.append(time.perf_counter() - start)
+
+    async def handle(self, request: str) -> str:
+        """
+        Обработчик запроса сервиса: json {"temp", "control", "rules", "t"}
+        -> json {"value", "latency_ms"} или {"error"}.
+        """
+        start = time.perf_counter()
+        try:
+            data = json.loads(request)
+            value = await self.infer(data["temp"], data["control"], data["rules"], data["t"])
+        except Exception as exc:
+            # любая ошибка разбора или вывода — ответ с ошибкой, а не обрыв сервиса
+            return json.dumps({"error": str(exc) or type(exc).__name__}, ensure_ascii=False)
+        return json.dumps({"value": value, "latency_ms": (time.perf_counter() - start) * 1e3})
+
+    def metrics(self) -> Dict[str, float]:
+        lat = sorted(self._latencies)
+
+        def quantile(q: float) -> float:
+            return lat[min(len(lat) - 1, int(q * len(lat)))] if lat else 0.0
+
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch": (self.requests / self.batches) if self.batches else 0.0,
+            "compiles": self.compiles,
+            "controllers": len(self._controllers),
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "latency_p50_ms": quantile(0.5) * 1e3,
+            "latency_p95_ms": quantile(0.95) * 1e3,
+            "latency_max_ms": (lat[-1] if lat else 0.0) * 1e3,
+        }
+
+
+class LocalClient:
+    """Клиент, вызывающий сервис в том же процессе (для тестов и отладки)."""
+
+    def __init__(self, service: FuzzyControlService) -> None:
+        self.service = service
+
+    async def infer(self, temp_mf_json: str, control_mf_json: str, rules_json: str,
+                    t: float) -> float:
+        request = json.dumps({"temp": temp_mf_json, "control": control_mf_json,
+                              "rules": rules_json, "t": t}, ensure_ascii=False)
+        response = json.loads(await self.service.handle(request))
+        if "error" in response:
+            raise ValueError(response["error"])
+        return response["value"]
+
+
+def main(temp_mf_json: str, control_mf_json: str, rules_json: str, t: float,
+         profile: Optional[Profile] = None, cache: Optional[ResultCache] = None) -> float:
+    # cache — ResultCache: повтор той же конфигурации и t берёт готовый результат
+    if cache is not None:
+        key = cache.key('task4', _normalize_json(temp_mf_json), _normalize_json(control_mf_json),
+                        _normalize_json(rules_json), float(t).hex())
+        hit, result = cache.get(key)
+        if not hit:
+            result = main(temp_mf_json, control_mf_json, rules_json, t, profile)
+            cache.put(key, result)
+        return result
+
+    # profile — Profile для замеров по этапам (None — без замеров)
+    if profile is None:
+        return compile_controller(temp_mf_json, control_mf_json, rules_json).infer(t)
+
+    profile.start()
+    controller = compile_controller(temp_mf_json, control_mf_json, rules_json)
+    profile.lap('compile', terms=len(controller.temp_terms), rules=len(controller.rules))
+    return controller.infer(t, profile)
+
+
+def main_multi(inputs_mf_json: str, control_mf_json: str, rules_json: str, values_json: str,
+               profile: Optional[Profile] = None) -> float:
+    # values_json — значения входов: {"температура": 20.5, "скорость": -0.3, ...}
+    if profile is not None:
+        profile.start()
+    values = json.loads(values_json)
+    if not isinstance(values, dict):
+        raise ValueError("Некорректный json со значениями входов: ожидался объект-словарь")
+    controller = compile_multi_controller(inputs_mf_json, control_mf_json, rules_json)
+    if profile is not None:
+        profile.lap('compile', inputs=len(controller.inputs), rules=controller.n_rules)
+    return controller.infer(values, profile)
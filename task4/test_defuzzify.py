@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Сверка точной дефаззификации FuzzyController.defuzzify с плотной сеткой
+на случайных конфигурациях.
+"""
+
+import importlib.util
+import json
+import os
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+_spec = importlib.util.spec_from_file_location(
+    "task4_task", os.path.join(os.path.dirname(os.path.abspath(__file__)), "task.py"))
+task = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(task)
+
+GRID_POINTS = 20001
+TOL = 1e-9
+
+
+def _terms(r, k, lo, hi, prefix):
+    out = []
+    for i in range(k):
+        xs = sorted(round(r.uniform(lo, hi), r.choice([0, 1, 2])) for _ in range(r.randint(1, 6)))
+        ys = [r.choice([0, 1, round(r.random(), 3)]) for _ in xs]
+        out.append({"id": f"{prefix}{i}", "points": [[x, y] for x, y in zip(xs, ys)]})
+    return json.dumps({"v": out})
+
+
+def _random_case(r):
+    ti, co = r.randint(1, 4), r.randint(1, 4)
+    temp = _terms(r, ti, -10, 40, "t")
+    control = _terms(r, co, r.choice([0, -3]), r.choice([5, 26]), "u")
+    rules = json.dumps([[f"t{r.randrange(ti)}", f"u{r.randrange(co)}"] for _ in range(r.randint(1, 6))])
+    return task.FuzzyController(temp, control, rules), r.uniform(-12, 45)
+
+
+def _aggregate(controller, t, xs):
+    agg = np.zeros_like(xs)
+    for c, alpha in controller._firing(t).items():
+        np.maximum(agg, np.minimum(controller.control_terms[c].evaluate(xs), alpha), out=agg)
+    return agg
+
+
+def _cases(n, seed):
+    r = random.Random(seed)
+    for _ in range(n):
+        controller, t = _random_case(r)
+        if controller.s_grid and controller.s_max > controller.s_min and controller._firing(t):
+            yield controller, t
+
+
+def test_first_max_is_leftmost_maximiser():
+    for controller, t in _cases(1600, 16):
+        x_star = controller.defuzzify(t, 'first_max')
+        xs = np.linspace(controller.s_min, controller.s_max, GRID_POINTS)
+        agg = _aggregate(controller, t, xs)
+        # в точке скачка максимум может достигаться только с одной стороны
+        top = _aggregate(controller, t, np.array([x_star - 1e-7, x_star, x_star + 1e-7])).max()
+        assert top >= agg.max() - 1e-6, (controller.rules, t, x_star)
+        # левее найденной точки сетка не видит значений уровня максимума
+        left = xs[xs < x_star - 1e-7]
+        assert not (_aggregate(controller, t, left) >= top - TOL).any(), (controller.rules, t, x_star)
+
+
+def test_mom_matches_grid_on_plateaus():
+    for controller, t in _cases(1600, 17):
+        xs = np.linspace(controller.s_min, controller.s_max, GRID_POINTS)
+        h = xs[1] - xs[0]
+        agg = _aggregate(controller, t, xs)
+        at_max = agg >= agg.max() - TOL
+        # отдельные точки максимума при наличии плато в mom не входят
+        plateau = at_max & (np.r_[False, at_max[:-1]] | np.r_[at_max[1:], False])
+        if plateau.sum() < GRID_POINTS // 100:
+            continue  # без заметного плато сетка середину максимумов не видит
+        # у каждого плато сетка может ошибиться на точку с каждого края
+        runs = int((plateau & ~np.r_[False, plateau[:-1]]).sum())
+        tol = 5 * h + 2 * runs * (controller.s_max - controller.s_min) / plateau.sum()
+        assert abs(controller.defuzzify(t, 'mom') - xs[plateau].mean()) <= tol, (controller.rules, t)
+
+
+def test_centroid_matches_grid_integral():
+    for controller, t in _cases(400, 18):
+        xs = np.linspace(controller.s_min, controller.s_max, GRID_POINTS)
+        agg = _aggregate(controller, t, xs)
+        integrate = getattr(np, 'trapezoid', None) or np.trapz
+        area = integrate(agg, xs)
+        if area <= 1e-6:
+            continue
+        expected = integrate(agg * xs, xs) / area
+        assert abs(controller.defuzzify(t, 'centroid') - expected) <= 1e-3 * (controller.s_max - controller.s_min)
+
+
+def test_clipped_plateau_start_regression():
+    temp = json.dumps({"t": [{"id": "t1", "points": [[6.77, 0.3], [12.22, 0.668], [18.37, 1]]}]})
+    control = json.dumps({"u": [{"id": "u3", "points": [[3.62, 0], [7.04, 0], [8.45, 0.5]]},
+                                {"id": "u0", "points": [[0.86, 0], [1, 0]]},
+                                {"id": "z", "points": [[9.07, 0]]}]})
+    controller = task.FuzzyController(temp, control, json.dumps([["t1", "u3"]]))
+    assert controller.defuzzify(4.0) == pytest.approx(7.886)
+    assert controller.defuzzify(4.0, 'mom') == pytest.approx((7.886 + 9.07) / 2)